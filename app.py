@@ -1,10 +1,40 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
-from main import math_agent_query  # This is now async
+from typing import List, Optional
+from sse_starlette.sse import EventSourceResponse
+from main import math_agent_query_detailed, math_agent_stream, math_agent_batch, get_routing_stats, warm_up, readiness  # This is now async
+from response_cache import response_cache, normalize_question
+from semantic_cache import semantic_cache
+from request_coalescer import ask_coalescer
+from mcp_client import mcp_client_instance
+from replay_store import replay_backend
+from evaluator import evaluation_router
+from symbolic_solver import symbolic_solver
+from llm_scheduler import llm_scheduler
+from feedback_queue import feedback_queue
+from knowledge_base import flush_pending_corrections, correction_stats, search_filter_stats
+from kb_ingest import ingest_jobs
+from metrics import registry, stats_samples, server_timing_header
+from contextlib import asynccontextmanager
 import asyncio
+import json
 
-app = FastAPI(title="Math Professor Agent API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so the server accepts connections immediately;
+    # /ready reports when the knowledge base and Gemini client are loaded
+    app.state.warm_up_task = asyncio.create_task(asyncio.to_thread(warm_up))
+    app.state.mcp_init_task = asyncio.create_task(mcp_client_instance.initialize())
+    feedback_queue.start()
+    yield
+    await feedback_queue.stop()
+    # Corrections from the last reviews may still be buffered
+    await asyncio.to_thread(flush_pending_corrections)
+    await mcp_client_instance.close()
+
+app = FastAPI(title="Math Professor Agent API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,15 +47,182 @@ app.add_middleware(
 class QueryRequest(BaseModel):
     question: str
 
+class BatchQueryRequest(BaseModel):
+    questions: List[str]
+    concurrency: Optional[int] = None
+
+class IngestRequest(BaseModel):
+    filename: str
+    batch_size: int = 64
+    workers: int = 4
+    resume: bool = True
+
+MAX_BATCH_SIZE = 100
+MAX_BATCH_CONCURRENCY = 16
+
 @app.post("/ask")
-async def ask_question(request: QueryRequest):
+async def ask_question(request: QueryRequest, response: Response, debug: bool = False):
+    try:
+        # Identical questions already in flight share one pipeline run
+        result = await ask_coalescer.run(
+            normalize_question(request.question),
+            lambda: math_agent_query_detailed(request.question)
+        )
+        response.headers["Server-Timing"] = server_timing_header(result["trace"])
+        body = {"answer": result["answer"]}
+        if result.get("feedback_ticket"):
+            body["feedback_ticket"] = result["feedback_ticket"]
+        if debug:
+            body["debug"] = result["trace"]
+        return body
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/ask/batch")
+async def ask_batch(request: BatchQueryRequest):
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="questions must not be empty")
+    if len(request.questions) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} questions per batch")
+    if request.concurrency is not None and not 1 <= request.concurrency <= MAX_BATCH_CONCURRENCY:
+        raise HTTPException(status_code=400, detail=f"concurrency must be between 1 and {MAX_BATCH_CONCURRENCY}")
+
     try:
-        # Now this is properly async
-        result = await math_agent_query(request.question)
-        return {"answer": result}
+        results = await math_agent_batch(request.questions, concurrency=request.concurrency)
+        return {"results": results}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/ask/stream")
+async def ask_question_stream(question: str):
+    """Stream the solution as Server-Sent Events (route, token..., final)"""
+    async def event_generator():
+        try:
+            async for event in math_agent_stream(question):
+                yield {"event": event["event"], "data": json.dumps(event["data"])}
+        except Exception as e:
+            yield {"event": "error", "data": json.dumps({"detail": str(e)})}
+
+    return EventSourceResponse(event_generator())
+
+MAX_FEEDBACK_WAIT = 30.0
+
+@app.get("/feedback/{ticket}")
+async def feedback_status(ticket: str, wait: float = 0.0):
+    """Status of a human-feedback ticket; ``wait`` long-polls up to that many seconds for the result"""
+    if wait < 0:
+        raise HTTPException(status_code=400, detail="wait must not be negative")
+    feedback_ticket = await feedback_queue.wait(ticket, timeout=min(wait, MAX_FEEDBACK_WAIT))
+    if feedback_ticket is None:
+        raise HTTPException(status_code=404, detail="Unknown feedback ticket")
+    return feedback_ticket.to_dict()
+
+MAX_INGEST_BATCH_SIZE = 1000
+MAX_INGEST_WORKERS = 16
+
+@app.post("/kb/ingest", status_code=202)
+async def start_ingest(request: IngestRequest):
+    """Start a bulk ingest of a JSONL/CSV archive from the ingest directory"""
+    if not 1 <= request.batch_size <= MAX_INGEST_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"batch_size must be between 1 and {MAX_INGEST_BATCH_SIZE}")
+    if not 1 <= request.workers <= MAX_INGEST_WORKERS:
+        raise HTTPException(status_code=400, detail=f"workers must be between 1 and {MAX_INGEST_WORKERS}")
+    try:
+        job_id = ingest_jobs.start(request.filename, batch_size=request.batch_size,
+                                   workers=request.workers, resume=request.resume)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"job": job_id, "status": "running"}
+
+@app.get("/kb/ingest/{job}")
+async def ingest_status(job: str):
+    """Progress and docs/sec throughput of an ingest job"""
+    progress = ingest_jobs.get(job)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Unknown ingest job")
+    return progress
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {
+        "response_cache": response_cache.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "coalescing": ask_coalescer.stats()
+    }
+
+@app.get("/routing/stats")
+async def routing_stats():
+    stats = get_routing_stats()
+    stats["mcp_client"] = mcp_client_instance.stats()
+    stats["replay"] = replay_backend.stats()
+    stats["evaluator"] = evaluation_router.stats()
+    stats["symbolic_solver"] = symbolic_solver.stats()
+    stats["llm_scheduler"] = llm_scheduler.stats()
+    stats["feedback_queue"] = feedback_queue.stats()
+    stats["kb_corrections"] = correction_stats()
+    stats["kb_category_filter"] = search_filter_stats()
+    return stats
+
+registry.register_gauges(
+    "math_agent_cache_stats", "Answer cache counters and sizes",
+    lambda: stats_samples("math_agent_cache_stats", response_cache.stats(), {"cache": "response"})
+    + stats_samples("math_agent_cache_stats", semantic_cache.stats(), {"cache": "semantic"})
+)
+registry.register_gauges(
+    "math_agent_coalescing", "Single-flight coalescing of identical /ask requests",
+    lambda: stats_samples("math_agent_coalescing", ask_coalescer.stats())
+)
+registry.register_gauges(
+    "math_agent_routing", "KB/MCP routing counters and latency totals",
+    lambda: stats_samples("math_agent_routing", get_routing_stats())
+)
+registry.register_gauges(
+    "math_agent_evaluator", "Answers graded by the local evaluator vs Gemini, and LLM calls saved",
+    lambda: stats_samples("math_agent_evaluator", evaluation_router.stats())
+)
+registry.register_gauges(
+    "math_agent_symbolic_solver", "Questions answered by the SymPy fast path vs passed on to the LLM route",
+    lambda: stats_samples("math_agent_symbolic_solver", symbolic_solver.stats())
+)
+registry.register_gauges(
+    "math_agent_llm_scheduler", "Gemini call scheduler: queue depth and wait per priority, rate-limit tokens, retries",
+    lambda: stats_samples("math_agent_llm_scheduler", llm_scheduler.stats())
+)
+registry.register_gauges(
+    "math_agent_feedback_queue", "Human-feedback queue depth, job counts, wait times and throughput",
+    lambda: stats_samples("math_agent_feedback_queue", feedback_queue.stats())
+)
+registry.register_gauges(
+    "math_agent_kb_corrections", "Buffered and written knowledge base corrections",
+    lambda: stats_samples("math_agent_kb_corrections", correction_stats())
+)
+registry.register_gauges(
+    "math_agent_kb_category_filter", "KB searches narrowed to a predicted category vs unfiltered",
+    lambda: stats_samples("math_agent_kb_category_filter", search_filter_stats())
+)
+registry.register_gauges(
+    "math_agent_mcp_client", "MCP circuit breaker and search cache state",
+    lambda: [
+        sample
+        for component in ("circuit_breaker", "result_cache", "negative_cache")
+        for sample in stats_samples("math_agent_mcp_client", mcp_client_instance.stats()[component], {"component": component})
+    ]
+)
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/ready")
+async def ready():
+    status = readiness()
+    status["state"] = "warm" if status["ready"] else "cold"
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
 @app.get("/")
 async def root():
     return {"message": "Math Professor Agent API is running!"}
@@ -0,0 +1,219 @@
+import asyncio
+import math
+import os
+import random
+import re
+import time
+from typing import Awaitable, Callable, List, Optional
+
+from guardrail_engine import guardrail_engine
+from tracing import annotate
+
+try:
+    from sympy import Rational, simplify
+    from sympy.parsing.sympy_parser import (
+        convert_xor, implicit_multiplication_application, parse_expr, standard_transformations
+    )
+    SYMPY_AVAILABLE = True
+    _SYMPY_TRANSFORMATIONS = standard_transformations + (implicit_multiplication_application, convert_xor)
+except ImportError:  # symbolic verification is optional
+    SYMPY_AVAILABLE = False
+
+# Numbers, single-letter variables (not letters inside words) and operators on either side of "="
+_EXPRESSION = r'(?:\d+(?:\.\d+)?|(?<![a-z])[a-z](?![a-z])|[+\-*/^() ])+'
+_EQUATION_PATTERN = re.compile(rf'({_EXPRESSION})=({_EXPRESSION})', re.IGNORECASE)
+_CLAIM_PATTERN = re.compile(r'\b([a-z])\s*=\s*(-?\d+(?:\.\d+)?(?:\s*/\s*\d+)?)(?![\d.])', re.IGNORECASE)
+
+def format_evaluation(accuracy: int, clarity: int, reason: str, threshold: int = 8,
+                      evaluator: str = "self-assessment") -> str:
+    """Render scores in the format the LLM evaluator is asked to use (and extract_scores_from_feedback parses)"""
+    if accuracy >= threshold and clarity >= threshold:
+        return f"APPROVED: {evaluator} (Accuracy Score: {accuracy}, Clarity Score: {clarity})"
+    return f"HUMAN_FEEDBACK_NEEDED: Accuracy Score: {accuracy}, Clarity Score: {clarity}. Reason: {reason}"
+
+class LocalScore:
+    def __init__(self, accuracy: int, clarity: int, reasons: List[str], checks: dict):
+        self.accuracy = accuracy
+        self.clarity = clarity
+        self.reasons = reasons
+        self.checks = checks
+
+    def as_evaluation(self, threshold: int) -> str:
+        reason = "; ".join(self.reasons) or "Local checks were inconclusive"
+        return format_evaluation(self.accuracy, self.clarity, reason, threshold, evaluator="local evaluator")
+
+class LocalEvaluator:
+    """Cheap scorer: guardrail-engine structure checks, KB consistency and optional symbolic verification"""
+
+    def score(self, question: str, solution: str, source: str, context: str,
+              generation_failed: bool = False) -> LocalScore:
+        reasons = []
+        checks = {}
+
+        # Clarity: step-by-step structure, length and mathematical vocabulary
+        step_count = guardrail_engine.count_steps(solution)
+        word_count = guardrail_engine.count_words(solution)
+        has_math_terms = guardrail_engine.has_solution_keywords(solution)
+        clarity = 4 + min(step_count, 4) + (1 if word_count >= 60 else 0) + (1 if has_math_terms else 0)
+        if step_count < 2:
+            reasons.append("Solution is not broken into steps")
+        if word_count < 20:
+            reasons.append("Solution is too short")
+        if "[REDACTED]" in solution:
+            clarity -= 3
+            reasons.append("Solution needed redaction")
+        checks.update(steps=step_count, words=word_count)
+
+        # Accuracy: symbolic check first, then agreement with the KB answer. Without
+        # either there is no evidence against the answer, so it starts at the approval score
+        accuracy = 8
+        verified = self._symbolic_check(question, solution)
+        checks['symbolic'] = verified
+        if verified is True:
+            accuracy = 10
+        elif verified is False:
+            accuracy = 3
+            reasons.append("Final answer does not satisfy the equation")
+        elif source == "Knowledge Base" and context:
+            similarity = self._similarity(solution, context)
+            checks['kb_similarity'] = similarity
+            if similarity is not None:
+                accuracy = 9 if similarity >= 0.75 else 8 if similarity >= 0.6 else 6
+                if similarity < 0.6:
+                    reasons.append("Solution disagrees with the knowledge base answer")
+        if generation_failed:
+            accuracy = 0
+            reasons.append("Solution generation failed")
+
+        return LocalScore(max(0, min(accuracy, 10)), max(0, min(clarity, 10)), reasons, checks)
+
+    @staticmethod
+    def _similarity(solution: str, context: str) -> Optional[float]:
+        """Cosine similarity of solution and KB context using the KB's embedding function"""
+        try:
+            from knowledge_base import math_kb
+
+            first, second = math_kb.embedding_function([solution, context])
+            dot = sum(a * b for a, b in zip(first, second))
+            norm = math.sqrt(sum(a * a for a in first)) * math.sqrt(sum(b * b for b in second))
+            return dot / norm if norm else None
+        except Exception as e:
+            print(f"⚠️ KB similarity check failed: {e}")
+            return None
+
+    @staticmethod
+    def _symbolic_check(question: str, solution: str) -> Optional[bool]:
+        """For single-variable equations, check the solution's final "x = value" claim.
+
+        Returns None when there is nothing to verify (or SymPy is missing).
+        """
+        if not SYMPY_AVAILABLE:
+            return None
+        equation = _EQUATION_PATTERN.search(question)
+        if not equation:
+            return None
+        try:
+            lhs = parse_expr(equation.group(1).strip(), transformations=_SYMPY_TRANSFORMATIONS)
+            rhs = parse_expr(equation.group(2).strip(), transformations=_SYMPY_TRANSFORMATIONS)
+        except Exception:
+            return None
+        symbols = (lhs - rhs).free_symbols
+        if len(symbols) != 1:
+            return None
+        symbol = symbols.pop()
+
+        claims = [value for name, value in _CLAIM_PATTERN.findall(solution) if name == symbol.name]
+        if not claims:
+            return None
+        try:
+            value = Rational(claims[-1].replace(" ", ""))
+            return bool(simplify((lhs - rhs).subs(symbol, value)) == 0)
+        except Exception:
+            return None
+
+class EvaluationRouter:
+    """Decide per answer whether the local scorer or the LLM evaluator grades it.
+
+    Modes: ``llm`` (always the LLM, the original behaviour), ``local``
+    (never the LLM) and ``hybrid``. In hybrid mode the local scorer only
+    approves: answers it scores at or above ``approve_threshold`` are
+    decided locally (bar a random ``llm_sample_rate`` share), and anything
+    lower goes to the LLM rather than straight to professor feedback. A
+    score within ``borderline_margin`` below the threshold is counted as
+    borderline, lower ones as low.
+    """
+
+    def __init__(self, mode: str = "llm", llm_sample_rate: float = 0.05,
+                 approve_threshold: int = 8, borderline_margin: int = 1):
+        self.mode = mode
+        self.llm_sample_rate = llm_sample_rate
+        self.approve_threshold = approve_threshold
+        self.borderline_margin = borderline_margin
+        self.local_evaluator = LocalEvaluator()
+        self.decisions = {'local': 0, 'llm': 0}
+        self.local_verdicts = {'approved': 0, 'feedback': 0}
+        self.llm_reasons = {'mode': 0, 'borderline': 0, 'low_score': 0, 'sample': 0}
+        self.llm_seconds_total = 0.0
+
+    def _is_borderline(self, score: LocalScore) -> bool:
+        lowest = min(score.accuracy, score.clarity)
+        return self.approve_threshold - self.borderline_margin <= lowest < self.approve_threshold
+
+    async def evaluate(self, question: str, solution: str, source: str, context: str,
+                       llm_evaluate: Callable[[], Awaitable[str]], generation_failed: bool = False) -> str:
+        """Return an evaluation string ("APPROVED: ..." or "HUMAN_FEEDBACK_NEEDED: ...")"""
+        if self.mode == "llm":
+            return await self._llm(llm_evaluate, 'mode')
+
+        # Embedding and SymPy work stay off the event loop
+        score = await asyncio.to_thread(
+            self.local_evaluator.score, question, solution, source, context, generation_failed
+        )
+        annotate('local_evaluation', {'accuracy': score.accuracy, 'clarity': score.clarity, **score.checks})
+        if self.mode == "hybrid":
+            # A failed generation has nothing for the LLM to grade
+            if min(score.accuracy, score.clarity) < self.approve_threshold and not generation_failed:
+                return await self._llm(llm_evaluate, 'borderline' if self._is_borderline(score) else 'low_score')
+            if random.random() < self.llm_sample_rate:
+                return await self._llm(llm_evaluate, 'sample')
+
+        self.decisions['local'] += 1
+        annotate('evaluator', 'local')
+        evaluation = score.as_evaluation(self.approve_threshold)
+        self.local_verdicts['approved' if evaluation.startswith("APPROVED") else 'feedback'] += 1
+        return evaluation
+
+    async def _llm(self, llm_evaluate: Callable[[], Awaitable[str]], reason: str) -> str:
+        self.decisions['llm'] += 1
+        self.llm_reasons[reason] += 1
+        annotate('evaluator', 'llm')
+        started = time.perf_counter()
+        try:
+            return await llm_evaluate()
+        finally:
+            self.llm_seconds_total += time.perf_counter() - started
+
+    def stats(self) -> dict:
+        llm_calls = self.decisions['llm']
+        mean_llm_seconds = self.llm_seconds_total / llm_calls if llm_calls else 0.0
+        return {
+            'mode': self.mode,
+            'local_decisions': self.decisions['local'],
+            'llm_decisions': llm_calls,
+            'llm_reason_mode': self.llm_reasons['mode'],
+            'llm_reason_borderline': self.llm_reasons['borderline'],
+            'llm_reason_low_score': self.llm_reasons['low_score'],
+            'llm_reason_sample': self.llm_reasons['sample'],
+            'local_approved': self.local_verdicts['approved'],
+            'local_feedback': self.local_verdicts['feedback'],
+            # Only local approvals save work: a local "needs feedback" still costs a professor call
+            'llm_calls_saved': self.local_verdicts['approved'],
+            'estimated_seconds_saved': self.local_verdicts['approved'] * mean_llm_seconds
+        }
+
+# Global evaluator stage
+evaluation_router = EvaluationRouter(
+    mode=os.getenv("EVALUATOR_MODE", "llm").lower(),
+    llm_sample_rate=float(os.getenv("EVALUATOR_LLM_SAMPLE_RATE", "0.05")),
+    borderline_margin=int(os.getenv("EVALUATOR_BORDERLINE_MARGIN", "1"))
+)
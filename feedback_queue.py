@@ -0,0 +1,192 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional
+
+from human_feedback import get_human_feedback, FEEDBACK_ENHANCED_HEADER
+from metrics import FEEDBACK_JOB_SECONDS, FEEDBACK_WAIT_SECONDS
+from llm_scheduler import llm_priority
+
+RefinedCallback = Callable[[str, str], Awaitable[None]]
+
+class FeedbackTicket:
+    """A low-scoring answer waiting for (or done with) human review"""
+
+    def __init__(self, question: str, evaluation: str, provisional_answer: str,
+                 on_refined: Optional[RefinedCallback] = None):
+        self.id = uuid.uuid4().hex
+        self.question = question
+        self.evaluation = evaluation
+        self.provisional_answer = provisional_answer
+        self.on_refined = on_refined
+        self.status = "queued"
+        self.refined_answer: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.done = asyncio.Event()
+
+    def to_dict(self) -> dict:
+        return {
+            'ticket': self.id,
+            'status': self.status,
+            'question': self.question,
+            'provisional_answer': self.provisional_answer,
+            'refined_answer': self.refined_answer,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+class FeedbackQueue:
+    """Background workers that run the human-feedback step off the request path.
+
+    ``/ask`` submits a ticket and returns the provisional answer at once;
+    clients poll (or long-poll) the ticket for the refined answer. With no
+    workers running (e.g. command-line use) the pipeline keeps reviewing
+    answers inline.
+    """
+
+    def __init__(self, workers: int = 2, max_tickets: int = 10000,
+                 handler: Callable[[str, str], Awaitable[str]] = get_human_feedback):
+        self.worker_count = workers
+        self.max_tickets = max_tickets
+        self.handler = handler
+        self.tickets: "OrderedDict[str, FeedbackTicket]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self.started_at: Optional[float] = None
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.in_progress = 0
+        self.wait_seconds_total = 0.0
+        self.max_wait_seconds = 0.0
+        self.job_seconds_total = 0.0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self):
+        """Start the workers on the running event loop (call from the app lifespan)"""
+        if self.running or self.worker_count <= 0:
+            return
+        self._queue = asyncio.Queue()
+        self.started_at = time.monotonic()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+        print(f"✅ Feedback queue started with {self.worker_count} workers")
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """Give queued reviews ``drain_timeout`` seconds to finish, then stop the workers"""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ Feedback queue stopped with {self._queue.qsize()} reviews still queued")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, question: str, evaluation: str, provisional_answer: str,
+               on_refined: Optional[RefinedCallback] = None) -> FeedbackTicket:
+        """Queue a review; ``on_refined(question, answer)`` runs if it produces an enhanced answer"""
+        ticket = FeedbackTicket(question, evaluation, provisional_answer, on_refined)
+        self.tickets[ticket.id] = ticket
+        self._forget_old_tickets()
+        self.submitted += 1
+        self._queue.put_nowait(ticket)
+        return ticket
+
+    def get(self, ticket_id: str) -> Optional[FeedbackTicket]:
+        return self.tickets.get(ticket_id)
+
+    async def wait(self, ticket_id: str, timeout: float) -> Optional[FeedbackTicket]:
+        """Return the ticket once it is finished or ``timeout`` seconds have passed"""
+        ticket = self.tickets.get(ticket_id)
+        if ticket is None or timeout <= 0:
+            return ticket
+        try:
+            await asyncio.wait_for(ticket.done.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        return ticket
+
+    def _forget_old_tickets(self):
+        # Drop the oldest finished tickets; unfinished ones are never dropped
+        excess = len(self.tickets) - self.max_tickets
+        if excess <= 0:
+            return
+        for ticket_id in [t.id for t in self.tickets.values() if t.done.is_set()][:excess]:
+            del self.tickets[ticket_id]
+
+    async def _worker(self):
+        while True:
+            ticket = await self._queue.get()
+            try:
+                await self._process(ticket)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, ticket: FeedbackTicket):
+        ticket.started_at = time.time()
+        ticket.status = "processing"
+        waited = ticket.started_at - ticket.created_at
+        self.wait_seconds_total += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        FEEDBACK_WAIT_SECONDS.observe(waited)
+
+        self.in_progress += 1
+        started = time.perf_counter()
+        try:
+            # Reviews nobody is waiting on yield to interactive Gemini calls
+            with llm_priority("feedback"):
+                refined_answer = await self.handler(ticket.question, ticket.evaluation)
+            ticket.refined_answer = refined_answer
+            if refined_answer.startswith(FEEDBACK_ENHANCED_HEADER):
+                ticket.status = "done"
+                self.completed += 1
+                if ticket.on_refined is not None:
+                    await ticket.on_refined(ticket.question, refined_answer)
+            else:
+                ticket.status = "failed"
+                self.failed += 1
+        except Exception as e:
+            print(f"⚠️ Feedback job {ticket.id} failed: {e}")
+            ticket.status = "failed"
+            self.failed += 1
+        finally:
+            elapsed = time.perf_counter() - started
+            self.in_progress -= 1
+            self.job_seconds_total += elapsed
+            FEEDBACK_JOB_SECONDS.observe(elapsed)
+            ticket.finished_at = time.time()
+            ticket.done.set()
+
+    def stats(self) -> dict:
+        finished = self.completed + self.failed
+        started = finished + self.in_progress
+        uptime = time.monotonic() - self.started_at if self.started_at else 0.0
+        return {
+            'running': self.running,
+            'workers': len(self._workers),
+            'queue_depth': self._queue.qsize() if self._queue else 0,
+            'in_progress': self.in_progress,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'mean_wait_seconds': self.wait_seconds_total / started if started else 0.0,
+            'max_wait_seconds': self.max_wait_seconds,
+            'mean_job_seconds': self.job_seconds_total / finished if finished else 0.0,
+            'throughput_per_minute': finished / uptime * 60 if uptime else 0.0
+        }
+
+# Global feedback queue; FEEDBACK_QUEUE_WORKERS=0 keeps feedback inline in /ask
+feedback_queue = FeedbackQueue(
+    workers=int(os.getenv("FEEDBACK_QUEUE_WORKERS", "2")),
+    max_tickets=int(os.getenv("FEEDBACK_MAX_TICKETS", "10000"))
+)
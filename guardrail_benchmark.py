@@ -0,0 +1,117 @@
+import argparse
+import random
+import re
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from guardrail_engine import INAPPROPRIATE_TERMS, SOLUTION_KEYWORDS, STEP_PATTERN, guardrail_engine
+
+# The per-call implementation the engine replaced, kept here as the comparison baseline
+LEGACY_INAPPROPRIATE_PATTERNS = [
+    r'\b(cannot|can\'t|don\'t know|unsure|guess|maybe|perhaps)\b',
+    r'\b(illegal|dangerous|harmful|violent|inappropriate)\b',
+    r'\b(\$\$|money|cash|price|cost|buy|sell)\b'
+]
+
+def legacy_validate(response: str) -> Tuple[bool, str]:
+    step_count = len(re.findall(STEP_PATTERN, response))
+    if step_count < 2:
+        return False, "Response should provide step-by-step solution"
+    if not any(keyword in response.lower() for keyword in SOLUTION_KEYWORDS):
+        return False, "Response should contain mathematical explanations"
+    for pattern in LEGACY_INAPPROPRIATE_PATTERNS:
+        if re.search(pattern, response, re.IGNORECASE):
+            return False, "Response contains inappropriate content"
+    if len(response.split()) < 20:
+        return False, "Response should be sufficiently detailed"
+    return True, "Valid educational response"
+
+def legacy_sanitize(response: str) -> str:
+    for pattern in LEGACY_INAPPROPRIATE_PATTERNS:
+        response = re.sub(pattern, '[REDACTED]', response, flags=re.IGNORECASE)
+    response = re.sub(r'\n{3,}', '\n\n', response)
+    return response.strip()
+
+FILLER_WORDS = (
+    "we", "substitute", "the", "value", "into", "expression", "and", "simplify", "both", "sides",
+    "so", "that", "x", "equals", "2", "squared", "plus", "3", "using", "product", "rule", "gives",
+    "term", "by", "cos(x)", "sin(x)", "=", "+", "dx"
+)
+
+def make_solution(size_bytes: int, seed: int, flagged: bool = False) -> str:
+    """Synthetic step-by-step solution of roughly ``size_bytes`` characters"""
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    step = 1
+    while length < size_bytes:
+        sentence = " ".join(rng.choice(FILLER_WORDS) for _ in range(rng.randint(12, 30)))
+        part = f"Step {step}. {sentence.capitalize()}.\n\n"
+        parts.append(part)
+        length += len(part)
+        step += 1
+    if flagged:
+        # One flagged term near the end, the worst case for an early-exit scan
+        parts.insert(len(parts) - 1, f"Perhaps the {rng.choice(INAPPROPRIATE_TERMS[2])} is relevant.\n\n\n\n")
+    parts.append("Therefore the result follows from the formula above.")
+    return "".join(parts)
+
+def time_per_call(func: Callable[[str], object], text: str, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func(text)
+    return (time.perf_counter() - started) / iterations
+
+def run(sizes_kb: List[int], iterations: int) -> List[Dict]:
+    rows = []
+    for size_kb in sizes_kb:
+        for flagged in (False, True):
+            text = make_solution(size_kb * 1024, seed=size_kb, flagged=flagged)
+            if legacy_validate(text) != guardrail_engine.validate_educational_content(text):
+                raise AssertionError(f"validate mismatch at {size_kb} KB (flagged={flagged})")
+            if legacy_sanitize(text) != guardrail_engine.sanitize(text):
+                raise AssertionError(f"sanitize mismatch at {size_kb} KB (flagged={flagged})")
+
+            for check, legacy, engine in (
+                ("validate", legacy_validate, guardrail_engine.validate_educational_content),
+                ("sanitize", legacy_sanitize, guardrail_engine.sanitize),
+            ):
+                legacy_seconds = time_per_call(legacy, text, iterations)
+                engine_seconds = time_per_call(engine, text, iterations)
+                rows.append({
+                    'size_kb': size_kb,
+                    'flagged': flagged,
+                    'check': check,
+                    'legacy_us': legacy_seconds * 1e6,
+                    'engine_us': engine_seconds * 1e6,
+                    'speedup': legacy_seconds / engine_seconds if engine_seconds else float('inf')
+                })
+    return rows
+
+def format_report(rows: List[Dict]) -> str:
+    lines = [
+        "🛡️ Guardrail Micro-Benchmark (per call)",
+        "=" * 62,
+        f"{'size':>6} {'flagged':>8} {'check':>9} {'legacy µs':>11} {'engine µs':>11} {'speedup':>8}"
+    ]
+    for row in rows:
+        lines.append(
+            f"{row['size_kb']:>4}KB {str(row['flagged']):>8} {row['check']:>9} "
+            f"{row['legacy_us']:>11.1f} {row['engine_us']:>11.1f} {row['speedup']:>7.1f}x"
+        )
+    return "\n".join(lines)
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Compare the guardrail engine with the per-call regex checks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 25, 50], help="solution sizes in KB")
+    parser.add_argument("--iterations", type=int, default=200, help="calls timed per check and size")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    print(format_report(run(args.sizes, args.iterations)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+import re
+from typing import Iterable, List, Optional, Tuple
+
+# Input guardrail: a question must mention one of these to be treated as math
+INPUT_MATH_KEYWORDS = (
+    'calculate', 'solve', 'equation', 'derivative', 'integral',
+    'algebra', 'geometry', 'theorem', 'formula', 'math', 'probability',
+    'trigonometry', 'calculus', 'matrix', 'vector', 'statistics'
+)
+
+# Phrases marking a web search result as not useful
+UNCERTAINTY_PHRASES = (
+    "i don't know", "i cannot", "not sure", "uncertain",
+    "no information", "not found", "unable to", "don't have"
+)
+
+# Output guardrail: a solution must mention one of these
+SOLUTION_KEYWORDS = (
+    'step', 'solution', 'calculate', 'formula', 'equation',
+    'theorem', 'proof', 'derivative', 'integral', 'solve',
+    'therefore', 'thus', 'hence', 'result', 'answer'
+)
+
+# Output guardrail: whole words/phrases that are flagged and redacted, one group per pattern
+INAPPROPRIATE_TERMS = (
+    ("cannot", "can't", "don't know", "unsure", "guess", "maybe", "perhaps"),
+    ("illegal", "dangerous", "harmful", "violent", "inappropriate"),
+    ("$$", "money", "cash", "price", "cost", "buy", "sell")
+)
+
+STEP_PATTERN = r'(Step \d+|step \d+|•|\d+\.)'
+
+def _word_pattern(terms: Iterable[str]) -> str:
+    return r'\b(' + '|'.join(re.escape(term) for term in terms) + r')\b'
+
+class KeywordSet:
+    """Case-insensitive "contains any of these substrings" test.
+
+    Works on text already lowercased once by the caller, so several checks
+    share a single lowercasing pass; each keyword test is then a C-level
+    substring search, which beats a combined IGNORECASE regex by an order
+    of magnitude on long texts.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = tuple(keyword.lower() for keyword in keywords)
+
+    def search_lowered(self, lowered: str) -> bool:
+        return any(keyword in lowered for keyword in self.keywords)
+
+    def search(self, text: str) -> bool:
+        return self.search_lowered(text.lower())
+
+class GuardrailEngine:
+    """Input and output guardrail checks compiled once and shared by all callers.
+
+    Every regex is compiled at construction. The inappropriate-content
+    patterns only run on texts that contain one of their literal terms
+    (found with plain substring search), so a clean solution costs one
+    lowercasing pass plus substring searches, regardless of its length.
+    Results match the original per-call ``re`` scans exactly.
+    """
+
+    def __init__(self,
+                 input_keywords: Iterable[str] = INPUT_MATH_KEYWORDS,
+                 uncertainty_phrases: Iterable[str] = UNCERTAINTY_PHRASES,
+                 solution_keywords: Iterable[str] = SOLUTION_KEYWORDS,
+                 inappropriate_terms: Iterable[Iterable[str]] = INAPPROPRIATE_TERMS,
+                 step_pattern: str = STEP_PATTERN):
+        self.input_keywords = KeywordSet(input_keywords)
+        self.uncertainty_phrases = KeywordSet(uncertainty_phrases)
+        self.solution_keywords = KeywordSet(solution_keywords)
+
+        self.inappropriate_terms = [tuple(term.lower() for term in group) for group in inappropriate_terms]
+        self.inappropriate_patterns = [_word_pattern(group) for group in self.inappropriate_terms]
+        self._inappropriate = [re.compile(pattern, re.IGNORECASE) for pattern in self.inappropriate_patterns]
+        self._steps = re.compile(step_pattern)
+        self._words = re.compile(r'\S+')
+        self._extra_newlines = re.compile(r'\n{3,}')
+
+    # Input checks
+
+    def validate_input(self, input_text: str) -> Tuple[bool, str]:
+        if not input_text or len(input_text.strip()) < 3:
+            return False, "Query too short. Please provide a complete question."
+        if not self.input_keywords.search(input_text):
+            return False, "This system only processes mathematics-related queries. Please ask a math question."
+        return True, ""
+
+    def contains_uncertainty(self, text: str) -> bool:
+        return self.uncertainty_phrases.search(text)
+
+    # Output checks
+
+    def count_steps(self, text: str, limit: Optional[int] = None) -> int:
+        """Number of step markers, counting no further than ``limit``"""
+        count = 0
+        for _ in self._steps.finditer(text):
+            count += 1
+            if limit is not None and count >= limit:
+                break
+        return count
+
+    def count_words(self, text: str, limit: Optional[int] = None) -> int:
+        """Whitespace-separated words (as str.split()), counting no further than ``limit``"""
+        if limit is None:
+            return len(text.split())
+        count = 0
+        for _ in self._words.finditer(text):
+            count += 1
+            if count >= limit:
+                break
+        return count
+
+    def has_solution_keywords(self, text: str, lowered: Optional[str] = None) -> bool:
+        return self.solution_keywords.search_lowered(text.lower() if lowered is None else lowered)
+
+    def _candidate_starts(self, text: str, lowered: Optional[str] = None) -> List[Tuple[int, int]]:
+        """(pattern index, earliest offset a match can start) for the patterns that could match.
+
+        Literal prefilter on the lowercased text: a pattern can only match
+        where one of its terms occurs. Non-ASCII texts skip it, since
+        IGNORECASE also matches a few characters (e.g. U+017F) that lower()
+        leaves alone, and lowercasing may shift offsets.
+        """
+        if not text.isascii():
+            return [(index, 0) for index in range(len(self._inappropriate))]
+        lowered = text.lower() if lowered is None else lowered
+        starts = []
+        for index, group in enumerate(self.inappropriate_terms):
+            offsets = [offset for offset in (lowered.find(term) for term in group) if offset >= 0]
+            if offsets:
+                starts.append((index, min(offsets)))
+        return starts
+
+    def has_inappropriate(self, text: str, lowered: Optional[str] = None) -> bool:
+        return any(
+            self._inappropriate[index].search(text, start) is not None
+            for index, start in self._candidate_starts(text, lowered)
+        )
+
+    def validate_educational_content(self, response: str) -> Tuple[bool, str]:
+        """Same checks, order and messages as the original OutputGuardrails method"""
+        if self.count_steps(response, limit=2) < 2:
+            return False, "Response should provide step-by-step solution"
+
+        lowered = response.lower()
+        if not self.has_solution_keywords(response, lowered):
+            return False, "Response should contain mathematical explanations"
+        if self.has_inappropriate(response, lowered):
+            return False, "Response contains inappropriate content"
+        if self.count_words(response, limit=20) < 20:
+            return False, "Response should be sufficiently detailed"
+        return True, "Valid educational response"
+
+    def redact(self, text: str) -> str:
+        """Replace inappropriate terms with [REDACTED].
+
+        Patterns are applied one after another, as before, but only those
+        whose terms occur in the text, and only from the first occurrence on.
+        """
+        for index, _ in self._candidate_starts(text):
+            # Offsets move as earlier patterns substitute, so look this one up afresh
+            start = dict(self._candidate_starts(text)).get(index)
+            if start is None:
+                continue
+            # Keep the character before the first occurrence so \b sees the same context
+            head = max(0, start - 1)
+            text = text[:head] + self._inappropriate[index].sub('[REDACTED]', text[head:])
+        return text
+
+    def collapse_newlines(self, text: str) -> str:
+        if '\n\n\n' not in text:
+            return text
+        return self._extra_newlines.sub('\n\n', text)
+
+    def sanitize(self, text: str) -> str:
+        return self.collapse_newlines(self.redact(text)).strip()
+
+    # Streaming support
+
+    def straddling_match_start(self, text: str, cut: int) -> int:
+        """Move ``cut`` back to the start of any inappropriate match crossing it.
+
+        Streamed text can only be released up to a point no match spans,
+        otherwise a term split across chunks would escape redaction.
+        """
+        for index, start in self._candidate_starts(text):
+            for match in self._inappropriate[index].finditer(text, start):
+                if match.start() < cut < match.end():
+                    cut = match.start()
+        return cut
+
+# Global engine shared by main.py, output_guardrails and the evaluator
+guardrail_engine = GuardrailEngine()
@@ -1,25 +1,27 @@
 from knowledge_base import math_kb
-import google.generativeai as genai
+from llm_client import llm_client
 from dotenv import load_dotenv
+import asyncio
 import os
 import re
 import requests
 
 load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel(
-    'gemini-1.5-flash',
-    generation_config={
-        "temperature": 0.1,
-        "max_output_tokens": 1000,
-    },
-    safety_settings=[
-        {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
-        {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
-        {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
-        {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"}
-    ]
-)
+
+# Prefix of every successfully refined answer
+FEEDBACK_ENHANCED_HEADER = "🎓 **Solution Enhanced by Professor Review:**"
+
+# Settings for the "professor" model; the shared client reuses one model object for them
+FEEDBACK_GENERATION_CONFIG = {
+    "temperature": 0.1,
+    "max_output_tokens": 1000,
+}
+FEEDBACK_SAFETY_SETTINGS = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"}
+]
 
 def is_human_feedback_available() -> bool:
     """
@@ -49,7 +51,7 @@ def extract_scores_from_feedback(feedback_text: str) -> tuple[int, int, str]:
     
     return accuracy, clarity, reason
 
-def get_human_feedback(original_question: str, agent_output: str) -> str:
+async def get_human_feedback(original_question: str, agent_output: str) -> str:
     """
     Complete human feedback implementation with real KB updating
     """
@@ -80,11 +82,17 @@ def get_human_feedback(original_question: str, agent_output: str) -> str:
     """
     
     try:
-        human_corrected_answer = model.generate_content(prompt).text
+        human_corrected_answer = await llm_client.generate(
+            prompt,
+            generation_config=FEEDBACK_GENERATION_CONFIG,
+            safety_settings=FEEDBACK_SAFETY_SETTINGS
+        )
         print(f"✅ Generated improved answer")
         
-        # Add to knowledge base for future learning (REAL implementation)
-        math_kb.add_corrected_answer(
+        # Add to knowledge base for future learning (REAL implementation);
+        # embedding and writing run in a thread so the event loop stays free
+        await asyncio.to_thread(
+            math_kb.add_corrected_answer,
             question=original_question,
             answer=human_corrected_answer,
             metadata={
@@ -96,7 +104,7 @@ def get_human_feedback(original_question: str, agent_output: str) -> str:
             }
         )
         
-        return f"""🎓 **Solution Enhanced by Professor Review:**
+        return f"""{FEEDBACK_ENHANCED_HEADER}
 
 {human_corrected_answer}
 
@@ -1,8 +1,14 @@
+import argparse
 import asyncio
 import json
+import sys
 import time
-from typing import List, Dict
-from main import math_agent_query
+from typing import List, Dict, Optional
+import main as pipeline
+from main import math_agent_query_detailed
+from metrics import nearest_rank
+from mcp_client import mcp_client_instance
+from llm_scheduler import llm_priority
 
 class JEEBenchmark:
     def __init__(self):
@@ -12,8 +18,14 @@ class JEEBenchmark:
             'correct_answers': 0,
             'kb_hits': 0,
             'web_searches': 0,
+            'symbolic_answers': 0,
             'avg_response_time': 0,
-            'accuracy_rate': 0
+            'accuracy_rate': 0,
+            'p50_response_time': 0,
+            'p95_response_time': 0,
+            'p99_response_time': 0,
+            'stage_timings': {},
+            'pipeline_mode': pipeline.PIPELINE_MODE
         }
 
     def load_jee_dataset(self, file_path: str = "jee_questions.json") -> List[Dict]:
@@ -38,37 +50,77 @@ class JEEBenchmark:
                 }
             ]
 
-    async def run_benchmark(self, questions: List[Dict]):
-        """Run benchmark against JEE questions"""
-        total_time = 0
-        
-        for i, q in enumerate(questions):
-            print(f"🧪 Testing question {i+1}/{len(questions)}: {q['question'][:50]}...")
-            
-            start_time = time.time()
-            response = await math_agent_query(q['question'])
-            elapsed = time.time() - start_time
-            total_time += elapsed
-            
+    async def run_benchmark(self, questions: List[Dict], concurrency: int = 1,
+                            warmup_runs: int = 0, use_cache: bool = False):
+        """Run benchmark against JEE questions.
+
+        ``warmup_runs`` passes over the question set are made first and not
+        recorded. Up to ``concurrency`` questions are in flight at once.
+        Answer caches are bypassed unless ``use_cache`` is set, so repeated
+        runs measure the full pipeline. Gemini calls run at benchmark
+        priority, so a benchmark against a live server yields to /ask.
+        """
+        with llm_priority("benchmark"):
+            await self._run_benchmark(questions, concurrency, warmup_runs, use_cache)
+
+    async def _run_benchmark(self, questions: List[Dict], concurrency: int, warmup_runs: int, use_cache: bool):
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def run_question(i: int, q: Dict, label: str = "🧪 Testing") -> Dict:
+            async with semaphore:
+                print(f"{label} question {i+1}/{len(questions)}: {q['question'][:50]}...")
+                start_time = time.perf_counter()
+                pipeline_result = await math_agent_query_detailed(q['question'], use_cache=use_cache)
+                elapsed = time.perf_counter() - start_time
+
+            response = pipeline_result['answer']
             # Evaluate response
             is_correct = self.evaluate_response(q['question'], response, q.get('expected_keywords', []))
-            source = self.detect_source(response)
-            
-            result = {
+            source = self.detect_source(pipeline_result)
+
+            print(f"   Time: {elapsed:.2f}s, Correct: {is_correct}, Source: {source}")
+            return {
                 'question': q['question'],
                 'response': response,
                 'time_taken': elapsed,
                 'correct': is_correct,
-                'source': source
+                'source': source,
+                'verdict': pipeline_result['verdict'],
+                'stages': pipeline_result['trace']['stages']
             }
-            
+
+        # Warm-up passes go through the same bounded path so they respect --concurrency
+        for run in range(warmup_runs):
+            print(f"🔥 Warm-up run {run + 1}/{warmup_runs}...")
+            await asyncio.gather(*(run_question(i, q, label="🔥 Warming up") for i, q in enumerate(questions)))
+
+        results = await asyncio.gather(*(run_question(i, q) for i, q in enumerate(questions)))
+        for result in results:
             self.results.append(result)
-            self.update_metrics(result, is_correct, source)
-            
-            print(f"   Time: {elapsed:.2f}s, Correct: {is_correct}, Source: {source}")
-        
-        self.metrics['avg_response_time'] = total_time / len(questions)
+            self.update_metrics(result, result['correct'], result['source'])
+
+        times = [result['time_taken'] for result in self.results]
+        self.metrics['avg_response_time'] = sum(times) / len(times)
         self.metrics['accuracy_rate'] = self.metrics['correct_answers'] / self.metrics['total_questions']
+        self.metrics['p50_response_time'] = nearest_rank(times, 50)
+        self.metrics['p95_response_time'] = nearest_rank(times, 95)
+        self.metrics['p99_response_time'] = nearest_rank(times, 99)
+        self.metrics['stage_timings'] = self.summarize_stages()
+
+    def summarize_stages(self) -> Dict[str, Dict[str, float]]:
+        """Mean and p95 seconds per pipeline stage, over the questions that ran it"""
+        per_stage: Dict[str, List[float]] = {}
+        for result in self.results:
+            for stage_name, seconds in result['stages'].items():
+                per_stage.setdefault(stage_name, []).append(seconds)
+        return {
+            stage_name: {
+                'count': len(values),
+                'mean': sum(values) / len(values),
+                'p95': nearest_rank(values, 95)
+            }
+            for stage_name, values in per_stage.items()
+        }
 
     def evaluate_response(self, question: str, response: str, expected_keywords: List[str]) -> bool:
         """Evaluate if response contains expected mathematical concepts"""
@@ -83,13 +135,20 @@ class JEEBenchmark:
         
         return keyword_matches >= len(expected_keywords) * 0.7 and has_steps and has_math_symbols
 
-    def detect_source(self, response: str) -> str:
-        """Detect where the answer came from"""
-        if "Knowledge Base" in response:
+    def detect_source(self, pipeline_result: Dict) -> str:
+        """Map the pipeline's routing source to a benchmark category"""
+        source = pipeline_result.get('source', '')
+        if source == "Knowledge Base":
             return "KB"
-        elif "Web Search" in response:
+        elif "Web Search" in source:
             return "Web"
-        elif "Error" in response:
+        elif source == "Human Feedback":
+            return "Human Feedback"
+        elif source == "Cache":
+            return "Cache"
+        elif source == "Symbolic Solver":
+            return "Symbolic"
+        elif source == "Guardrail" or pipeline_result['answer'].startswith("Error"):
             return "Error"
         else:
             return "Unknown"
@@ -103,18 +162,30 @@ class JEEBenchmark:
             self.metrics['kb_hits'] += 1
         elif source == "Web":
             self.metrics['web_searches'] += 1
+        elif source == "Symbolic":
+            self.metrics['symbolic_answers'] += 1
 
     def generate_report(self) -> str:
         """Generate benchmark report"""
         report = [
             "📊 JEE Benchmark Results",
             "=" * 50,
+            f"Pipeline Mode: {self.metrics['pipeline_mode']}",
             f"Total Questions: {self.metrics['total_questions']}",
             f"Correct Answers: {self.metrics['correct_answers']}",
             f"Accuracy Rate: {self.metrics['accuracy_rate']:.2%}",
             f"Knowledge Base Hits: {self.metrics['kb_hits']}",
             f"Web Searches: {self.metrics['web_searches']}",
+            f"Symbolic Solver Answers: {self.metrics['symbolic_answers']}",
             f"Average Response Time: {self.metrics['avg_response_time']:.2f}s",
+            f"Latency p50/p95/p99: {self.metrics['p50_response_time']:.2f}s / "
+            f"{self.metrics['p95_response_time']:.2f}s / {self.metrics['p99_response_time']:.2f}s",
+            "",
+            "Stage Timings (mean / p95):"
+        ]
+        for stage_name, timing in self.metrics['stage_timings'].items():
+            report.append(f"   {stage_name}: {timing['mean']:.2f}s / {timing['p95']:.2f}s ({timing['count']} runs)")
+        report += [
             "",
             "Detailed Results:",
             "-" * 30
@@ -126,13 +197,64 @@ class JEEBenchmark:
         
         return "\n".join(report)
 
-async def main():
-    """Run JEE benchmark"""
+    def to_json(self) -> Dict:
+        """Machine-readable results, suitable as a baseline for later runs"""
+        return {
+            'metrics': self.metrics,
+            'results': [
+                {key: value for key, value in result.items() if key != 'response'}
+                for result in self.results
+            ]
+        }
+
+def compare_to_baseline(current: Dict, baseline: Dict, max_latency_regression: float = 0.2,
+                        max_accuracy_drop: float = 0.05) -> List[str]:
+    """Return a description of every regression past the allowed thresholds.
+
+    Latency regressions are relative (0.2 = 20% slower p50/p95/p99);
+    accuracy drops are absolute (0.05 = five percentage points).
+    """
+    regressions = []
+    for key in ('p50_response_time', 'p95_response_time', 'p99_response_time'):
+        before, after = baseline['metrics'].get(key, 0), current['metrics'][key]
+        if before and after > before * (1 + max_latency_regression):
+            regressions.append(f"{key}: {before:.2f}s -> {after:.2f}s (+{(after / before - 1):.0%})")
+
+    before, after = baseline['metrics'].get('accuracy_rate', 0), current['metrics']['accuracy_rate']
+    if after < before - max_accuracy_drop:
+        regressions.append(f"accuracy_rate: {before:.2%} -> {after:.2%}")
+    return regressions
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the JEE benchmark against the math agent pipeline")
+    parser.add_argument("--dataset", default="jee_questions.json", help="JSON file with benchmark questions")
+    parser.add_argument("--concurrency", type=int, default=1, help="questions in flight at once")
+    parser.add_argument("--warmup", type=int, default=0, help="unrecorded warm-up passes over the dataset")
+    parser.add_argument("--use-cache", action="store_true", help="let answer caches serve repeated questions")
+    parser.add_argument("--pipeline-mode", choices=["two_call", "self_graded"],
+                        help="override PIPELINE_MODE, e.g. to A/B the self-graded single-call mode")
+    parser.add_argument("--json-out", help="write machine-readable results to this file")
+    parser.add_argument("--baseline", help="compare against a JSON file from an earlier --json-out run")
+    parser.add_argument("--max-latency-regression", type=float, default=0.2,
+                        help="allowed relative p50/p95/p99 increase over the baseline (default 0.2)")
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.05,
+                        help="allowed absolute accuracy drop versus the baseline (default 0.05)")
+    return parser.parse_args(argv)
+
+async def main(argv: Optional[List[str]] = None) -> int:
+    """Run JEE benchmark; returns a non-zero exit code on regression"""
+    args = parse_args(argv)
+    if args.pipeline_mode:
+        pipeline.PIPELINE_MODE = args.pipeline_mode
     benchmark = JEEBenchmark()
-    questions = benchmark.load_jee_dataset()
+    questions = benchmark.load_jee_dataset(args.dataset)
     
     print("🚀 Starting JEE Benchmark...")
-    await benchmark.run_benchmark(questions)
+    try:
+        await benchmark.run_benchmark(questions, concurrency=args.concurrency,
+                                      warmup_runs=args.warmup, use_cache=args.use_cache)
+    finally:
+        await mcp_client_instance.close()
     
     report = benchmark.generate_report()
     print("\n" + report)
@@ -141,5 +263,26 @@ async def main():
     with open("jee_benchmark_results.txt", "w") as f:
         f.write(report)
 
+    current = benchmark.to_json()
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"💾 JSON results written to {args.json_out}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        baseline_mode = baseline['metrics'].get('pipeline_mode', 'two_call')
+        if baseline_mode != current['metrics']['pipeline_mode']:
+            print(f"ℹ️ Comparing pipeline mode {current['metrics']['pipeline_mode']} against baseline mode {baseline_mode}")
+        regressions = compare_to_baseline(current, baseline, args.max_latency_regression, args.max_accuracy_drop)
+        if regressions:
+            print("❌ Regressions against baseline:")
+            for regression in regressions:
+                print(f"   {regression}")
+            return 1
+        print("✅ No regressions against baseline")
+    return 0
+
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    sys.exit(asyncio.run(main()))
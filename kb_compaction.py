@@ -0,0 +1,198 @@
+import argparse
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from knowledge_base import BACKUP_SUFFIX, COMPACTING_SUFFIX, KB_PERSIST_DIRECTORY, SEED_SOURCE, MathKnowledgeBase
+from metrics import nearest_rank
+from semantic_cache import math_signature
+
+COPY_BATCH_SIZE = 500
+
+def quality(metadata: dict) -> Tuple[float, float]:
+    """Sort key for picking a cluster's survivor: scores first, then the newest correction"""
+    score = float(metadata.get('accuracy_score', 0) or 0) + float(metadata.get('clarity_score', 0) or 0)
+    return score, float(metadata.get('corrected_at', 0) or 0)
+
+def plan_compaction(ids: List[str], embeddings: np.ndarray, metadatas: List[dict],
+                    threshold: float) -> Dict[str, List[str]]:
+    """Group near-duplicates and pick one survivor per group.
+
+    Entries are visited best-first; each joins the nearest survivor within
+    ``threshold`` cosine distance that has the same math signature (the
+    ordered math tokens, as in the semantic cache) or becomes a survivor
+    itself. Seed documents are always survivors (the knowledge base re-adds
+    missing seeds at startup), and corrections close to a seed are merged
+    into it. Returns survivor id -> ids of the entries it replaces.
+    """
+    if not ids:
+        return {}
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    unit = embeddings / np.where(norms == 0, 1, norms)
+
+    is_seed = [metadata.get('source') == SEED_SOURCE for metadata in metadatas]
+    signatures = [math_signature(metadata.get('question') or '') for metadata in metadatas]
+    order = sorted(range(len(ids)), key=lambda i: (is_seed[i], quality(metadatas[i])), reverse=True)
+
+    # Survivor vectors per signature, written into preallocated blocks (no per-entry copies)
+    group_sizes: Dict[str, int] = {}
+    for signature in signatures:
+        group_sizes[signature] = group_sizes.get(signature, 0) + 1
+    blocks = {signature: np.empty((size, unit.shape[1])) for signature, size in group_sizes.items()}
+    members: Dict[str, List[int]] = {signature: [] for signature in group_sizes}
+
+    clusters: Dict[str, List[str]] = {}
+    for i in order:
+        signature = signatures[i]
+        survivors = members[signature]
+        if survivors and not is_seed[i]:
+            distances = 1 - blocks[signature][:len(survivors)] @ unit[i]
+            nearest = int(np.argmin(distances))
+            if distances[nearest] <= threshold:
+                clusters[ids[survivors[nearest]]].append(ids[i])
+                continue
+        blocks[signature][len(survivors)] = unit[i]
+        survivors.append(i)
+        clusters[ids[i]] = []
+    return clusters
+
+def measure_search_latency(collection, query_embeddings: List[List[float]], n_results: int = 2,
+                           duplicate_threshold: float = 0.1) -> dict:
+    """Index query latency (embedding excluded) and how often the top results are near-duplicates"""
+    if not query_embeddings or collection.count() == 0:
+        return {'queries': 0, 'mean_ms': 0.0, 'p95_ms': 0.0, 'top_duplicate_rate': 0.0}
+    timings = []
+    duplicates = 0
+    for embedding in query_embeddings:
+        started = time.perf_counter()
+        results = collection.query(query_embeddings=[embedding], n_results=min(n_results, collection.count()),
+                                   include=["embeddings"])
+        timings.append((time.perf_counter() - started) * 1000)
+        top = np.array(results['embeddings'][0], dtype=float)
+        if len(top) >= 2:
+            top = top / np.linalg.norm(top, axis=1, keepdims=True)
+            duplicates += float(1 - top[0] @ top[1]) <= duplicate_threshold
+    return {
+        'queries': len(timings),
+        'mean_ms': sum(timings) / len(timings),
+        'p95_ms': nearest_rank(timings, 95),
+        'top_duplicate_rate': duplicates / len(timings)
+    }
+
+def rebuild_collection(kb: MathKnowledgeBase, entries: dict, keep_ids: List[str]):
+    """Copy the surviving entries (with their stored embeddings) into a fresh collection and swap it in.
+
+    The live collection is renamed to a backup before the rebuilt one takes
+    its name, and is only dropped after that succeeds; MathKnowledgeBase
+    recovers from a crash at any point in between on its next start.
+    """
+    name = kb.collection.name
+    temp_name = name + COMPACTING_SUFFIX
+    backup_name = name + BACKUP_SUFFIX
+    try:
+        kb.client.delete_collection(temp_name)
+    except ValueError:
+        pass  # no leftover from an interrupted run
+    rebuilt = kb.client.create_collection(
+        name=temp_name,
+        metadata=kb.collection.metadata,
+        embedding_function=kb.embedding_function
+    )
+
+    index = {item_id: i for i, item_id in enumerate(entries['ids'])}
+    for offset in range(0, len(keep_ids), COPY_BATCH_SIZE):
+        batch = [index[item_id] for item_id in keep_ids[offset:offset + COPY_BATCH_SIZE]]
+        rebuilt.add(
+            ids=[entries['ids'][i] for i in batch],
+            embeddings=[entries['embeddings'][i] for i in batch],
+            documents=[entries['documents'][i] for i in batch],
+            metadatas=[entries['metadatas'][i] for i in batch]
+        )
+
+    live = kb.collection
+    live.modify(name=backup_name)
+    try:
+        rebuilt.modify(name=name)
+    except BaseException:
+        live.modify(name=name)
+        raise
+    kb.collection = rebuilt
+    kb.corrections.collection = rebuilt
+    kb.client.delete_collection(backup_name)
+
+def compact_knowledge_base(kb: MathKnowledgeBase, threshold: float = 0.1, dry_run: bool = False,
+                           latency_queries: int = 50) -> dict:
+    kb.corrections.flush()
+    entries = kb.collection.get(include=["embeddings", "documents", "metadatas"])
+    ids = entries['ids']
+    embeddings = np.array(entries['embeddings'], dtype=float) if ids else np.zeros((0, 0))
+
+    # Latency is measured with stored embeddings so model time does not drown the index time
+    step = max(1, len(ids) // max(1, latency_queries))
+    sample = [entries['embeddings'][i] for i in range(0, len(ids), step)][:latency_queries]
+    before = measure_search_latency(kb.collection, sample, duplicate_threshold=threshold)
+
+    clusters = plan_compaction(ids, embeddings, entries['metadatas'], threshold)
+    removed = sum(len(members) for members in clusters.values())
+    report = {
+        'threshold': threshold,
+        'dry_run': dry_run,
+        'documents_before': len(ids),
+        'documents_after': len(clusters),
+        'removed': removed,
+        'merged_clusters': sum(1 for members in clusters.values() if members),
+        'search_before': before,
+        'search_after': before
+    }
+    if dry_run or not removed:
+        return report
+
+    started = time.perf_counter()
+    rebuild_collection(kb, entries, list(clusters))
+    report['rebuild_seconds'] = time.perf_counter() - started
+    report['documents_after'] = kb.collection.count()
+    report['search_after'] = measure_search_latency(kb.collection, sample, duplicate_threshold=threshold)
+    return report
+
+def format_report(report: dict) -> str:
+    before, after = report['search_before'], report['search_after']
+    lines = [
+        "🧹 Knowledge Base Compaction" + (" (dry run)" if report['dry_run'] else ""),
+        "=" * 50,
+        f"Duplicate threshold (cosine distance): {report['threshold']}",
+        f"Documents: {report['documents_before']} -> {report['documents_after']} "
+        f"({report['removed']} removed from {report['merged_clusters']} clusters)",
+        f"Search latency mean/p95: {before['mean_ms']:.2f}ms / {before['p95_ms']:.2f}ms -> "
+        f"{after['mean_ms']:.2f}ms / {after['p95_ms']:.2f}ms ({after['queries']} queries)",
+        f"Top-2 results that are near-duplicates: {before['top_duplicate_rate']:.1%} -> "
+        f"{after['top_duplicate_rate']:.1%}"
+    ]
+    if 'rebuild_seconds' in report:
+        lines.append(f"Rebuild time: {report['rebuild_seconds']:.2f}s")
+    return "\n".join(lines)
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Merge near-duplicate knowledge base entries and rebuild the collection")
+    parser.add_argument("--persist-directory", default=KB_PERSIST_DIRECTORY, help="ChromaDB directory to compact")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="max cosine distance for two entries to count as duplicates (default 0.1)")
+    parser.add_argument("--latency-queries", type=int, default=50, help="queries used to measure search latency")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be removed without changing anything")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    if not args.persist_directory:
+        print("❌ Compaction needs an on-disk knowledge base (set --persist-directory or KB_PERSIST_DIRECTORY)")
+        return 2
+    # Run with the API server stopped: it keeps its own handle on the collection
+    kb = MathKnowledgeBase(args.persist_directory)
+    report = compact_knowledge_base(kb, threshold=args.threshold, dry_run=args.dry_run,
+                                    latency_queries=args.latency_queries)
+    print(format_report(report))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
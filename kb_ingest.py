@@ -0,0 +1,281 @@
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from knowledge_base import KB_PERSIST_DIRECTORY, MathKnowledgeBase, build_kb_document, get_math_kb
+
+INGEST_SOURCE = "bulk_ingest"
+DIFFICULTIES = ("easy", "medium", "hard", "advanced", "expert")
+# The API only reads archives from here
+INGEST_DIRECTORY = os.getenv("KB_INGEST_DIRECTORY", "./ingest")
+
+def iter_records(path: str) -> Iterator[dict]:
+    """Stream raw records from a JSONL or CSV file without loading it whole"""
+    if path.lower().endswith(".csv"):
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            yield from csv.DictReader(f)
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield {'_error': f"invalid JSON: {e}"}
+
+def validate_record(raw: dict) -> Tuple[Optional[dict], Optional[str]]:
+    """Check a record against the KB item schema; returns (item, None) or (None, error)"""
+    if not isinstance(raw, dict):
+        return None, "record is not an object"
+    if '_error' in raw:
+        return None, raw['_error']
+
+    item = {}
+    for field in ('question', 'answer'):
+        value = raw.get(field)
+        if not isinstance(value, str) or not value.strip():
+            return None, f"missing {field}"
+        item[field] = value.strip()
+
+    category = raw.get('category')
+    if category:
+        if not isinstance(category, str):
+            return None, "category must be a string"
+        item['category'] = category.strip().lower()
+
+    difficulty = raw.get('difficulty')
+    if difficulty:
+        difficulty = str(difficulty).strip().lower()
+        if difficulty not in DIFFICULTIES:
+            return None, f"unknown difficulty {difficulty!r}"
+        item['difficulty'] = difficulty
+
+    tags = raw.get('tags')
+    if tags:
+        if isinstance(tags, str):
+            # CSV cells: a JSON list or comma-separated tags
+            try:
+                tags = json.loads(tags) if tags.lstrip().startswith('[') else tags.split(',')
+            except ValueError:
+                return None, "tags is not a valid JSON list"
+        if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+            return None, "tags must be a list of strings"
+        item['tags'] = [tag.strip() for tag in tags if tag.strip()]
+    return item, None
+
+def ingest_item_id(item: dict) -> str:
+    """Content hash, so re-ingesting the same archive overwrites instead of duplicating"""
+    digest = hashlib.sha256(json.dumps(item, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+    return f"ingest_{digest[:16]}"
+
+class IngestProgress:
+    """Counters of a running ingest, readable from another thread"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.status = "running"
+        self.records = 0
+        self.ingested = 0
+        self.invalid = 0
+        self.resumed_from = 0
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.errors: List[str] = []
+        self.error: Optional[str] = None
+
+    @property
+    def seconds(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    def to_dict(self) -> dict:
+        return {
+            'path': self.path,
+            'status': self.status,
+            'records': self.records,
+            'ingested': self.ingested,
+            'invalid': self.invalid,
+            'resumed_from': self.resumed_from,
+            'seconds': self.seconds,
+            'docs_per_second': self.ingested / self.seconds if self.seconds else 0.0,
+            'errors': list(self.errors),
+            'error': self.error
+        }
+
+def _load_checkpoint(checkpoint_path: str, path: str) -> int:
+    try:
+        with open(checkpoint_path, 'r') as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return 0
+    if checkpoint.get('path') != os.path.abspath(path):
+        return 0
+    return int(checkpoint.get('records_done', 0))
+
+def _save_checkpoint(checkpoint_path: str, path: str, progress: IngestProgress):
+    temp_path = f"{checkpoint_path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump({'path': os.path.abspath(path), 'records_done': progress.records, 'ingested': progress.ingested,
+                   'invalid': progress.invalid, 'saved_at': time.time()}, f)
+    os.replace(temp_path, checkpoint_path)
+
+def _embed_batch(kb: MathKnowledgeBase, items: List[dict]) -> Tuple[List[str], List[str], List[dict], list]:
+    ids, documents, metadatas = [], [], []
+    if not items:
+        return ids, documents, metadatas, []
+    for item in items:
+        document_text, metadata = build_kb_document(item)
+        metadata['source'] = INGEST_SOURCE
+        ids.append(ingest_item_id(item))
+        documents.append(document_text)
+        metadatas.append(metadata)
+    embeddings = np.asarray(kb.embedding_function(documents), dtype=float).tolist()
+    return ids, documents, metadatas, embeddings
+
+def ingest_file(kb: MathKnowledgeBase, path: str, batch_size: int = 64, workers: int = 4,
+                checkpoint_path: Optional[str] = None, resume: bool = True,
+                progress: Optional[IngestProgress] = None, report_every: float = 5.0) -> dict:
+    """Validate, embed (``workers`` batches at a time) and upsert every record of ``path``.
+
+    After each written batch the number of input records done is saved to
+    ``checkpoint_path``; with ``resume`` a rerun skips that many records.
+    """
+    checkpoint_path = checkpoint_path or f"{path}.checkpoint.json"
+    progress = progress or IngestProgress(path)
+    skip = _load_checkpoint(checkpoint_path, path) if resume else 0
+    progress.records = progress.resumed_from = skip
+    last_report = time.perf_counter()
+
+    def write(future, batch_records: int):
+        nonlocal last_report
+        ids, documents, metadatas, embeddings = future.result()
+        if ids:
+            kb.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+        progress.ingested += len(ids)
+        progress.records += batch_records
+        _save_checkpoint(checkpoint_path, path, progress)
+        if time.perf_counter() - last_report >= report_every:
+            last_report = time.perf_counter()
+            stats = progress.to_dict()
+            print(f"📥 {stats['records']} records, {stats['ingested']} ingested, {stats['invalid']} invalid "
+                  f"({stats['docs_per_second']:.0f} docs/s)")
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="kb-ingest") as pool:
+            in_flight = deque()
+            batch: List[dict] = []
+            batch_records = 0
+            for index, raw in enumerate(iter_records(path)):
+                if index < skip:
+                    continue
+                batch_records += 1
+                item, error = validate_record(raw)
+                if error:
+                    progress.invalid += 1
+                    if len(progress.errors) < 20:
+                        progress.errors.append(f"record {index + 1}: {error}")
+                else:
+                    batch.append(item)
+                if len(batch) >= batch_size:
+                    in_flight.append((pool.submit(_embed_batch, kb, batch), batch_records))
+                    batch, batch_records = [], 0
+                    # Keep a bounded number of batches embedding; write them in input order
+                    while len(in_flight) >= max(1, workers) * 2:
+                        write(*in_flight.popleft())
+            if batch_records:
+                in_flight.append((pool.submit(_embed_batch, kb, batch), batch_records))
+            while in_flight:
+                write(*in_flight.popleft())
+        progress.status = "done"
+    except Exception as e:
+        progress.status = "failed"
+        progress.error = str(e)
+        raise
+    finally:
+        progress.finished = time.perf_counter()
+    return progress.to_dict()
+
+class IngestJobs:
+    """Ingest runs started through the API, one at a time, each in a worker thread"""
+
+    def __init__(self, directory: str = INGEST_DIRECTORY):
+        self.directory = directory
+        self.jobs: Dict[str, IngestProgress] = {}
+        self._running: Optional[asyncio.Task] = None
+
+    def resolve(self, filename: str) -> str:
+        """Path of ``filename`` inside the ingest directory; refuses anything outside it"""
+        root = os.path.realpath(self.directory)
+        path = os.path.realpath(os.path.join(root, filename))
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError("file must be inside the ingest directory")
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"{filename} not found in the ingest directory")
+        return path
+
+    @property
+    def busy(self) -> bool:
+        return self._running is not None and not self._running.done()
+
+    def start(self, filename: str, batch_size: int = 64, workers: int = 4, resume: bool = True) -> str:
+        path = self.resolve(filename)
+        if self.busy:
+            raise RuntimeError("an ingest is already running")
+        job_id = uuid.uuid4().hex
+        progress = IngestProgress(path)
+        self.jobs[job_id] = progress
+        self._running = asyncio.create_task(self._run(path, batch_size, workers, resume, progress))
+        return job_id
+
+    async def _run(self, path: str, batch_size: int, workers: int, resume: bool, progress: IngestProgress):
+        try:
+            await asyncio.to_thread(
+                ingest_file, get_math_kb(), path, batch_size=batch_size, workers=workers,
+                resume=resume, progress=progress
+            )
+        except Exception as e:
+            print(f"❌ Ingest of {path} failed: {e}")
+
+    def get(self, job_id: str) -> Optional[dict]:
+        progress = self.jobs.get(job_id)
+        return progress.to_dict() if progress else None
+
+# Global ingest job registry for the API
+ingest_jobs = IngestJobs()
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Bulk-load a JSONL or CSV problem archive into the knowledge base")
+    parser.add_argument("path", help="JSONL or CSV file with question, answer, category, difficulty, tags")
+    parser.add_argument("--persist-directory", default=KB_PERSIST_DIRECTORY, help="ChromaDB directory to load into")
+    parser.add_argument("--batch-size", type=int, default=64, help="records embedded and written per batch")
+    parser.add_argument("--workers", type=int, default=4, help="batches embedded in parallel")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <path>.checkpoint.json)")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint and start from the top")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    kb = MathKnowledgeBase(args.persist_directory)
+    report = ingest_file(kb, args.path, batch_size=args.batch_size, workers=args.workers,
+                         checkpoint_path=args.checkpoint, resume=not args.restart)
+    print(f"✅ Ingested {report['ingested']} documents from {report['records']} records "
+          f"({report['invalid']} invalid, resumed at {report['resumed_from']}) "
+          f"in {report['seconds']:.1f}s: {report['docs_per_second']:.0f} docs/s")
+    for error in report['errors']:
+        print(f"   ⚠️ {error}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+import argparse
+import json
+import sys
+import time
+from typing import Dict, List, Optional
+
+from knowledge_base import KB_PERSIST_DIRECTORY, MathKnowledgeBase
+from metrics import nearest_rank
+from query_classifier import query_classifier
+
+def load_queries(kb: MathKnowledgeBase, path: Optional[str]) -> List[Dict[str, str]]:
+    """Queries with the KB question each should retrieve; defaults to every stored question"""
+    if path:
+        with open(path, 'r') as f:
+            return json.load(f)
+    metadatas = kb.collection.get(include=["metadatas"])['metadatas']
+    return [
+        {'question': metadata['question'], 'expected_question': metadata['question']}
+        for metadata in metadatas if metadata.get('question')
+    ]
+
+def run_mode(kb: MathKnowledgeBase, queries: List[Dict[str, str]], embeddings: List[List[float]],
+             filtered: bool, n_results: int, threshold: float) -> dict:
+    timings = []
+    hits = 0
+    false_matches = 0
+    narrowed = 0
+    for query, embedding in zip(queries, embeddings):
+        started = time.perf_counter()
+        where = query_classifier.where_filter(query['question']) if filtered else None
+        results = kb.collection.query(query_embeddings=[embedding], n_results=n_results, where=where,
+                                      include=["metadatas", "documents", "distances"])
+        timings.append((time.perf_counter() - started) * 1000)
+        narrowed += where is not None
+
+        matched_question, _ = kb._best_match(results, 0, threshold)
+        if matched_question == query['expected_question']:
+            hits += 1
+        elif matched_question is not None:
+            false_matches += 1
+    total = len(queries)
+    return {
+        'mean_ms': sum(timings) / total if total else 0.0,
+        'p95_ms': nearest_rank(timings, 95),
+        'recall': hits / total if total else 0.0,
+        'false_match_rate': false_matches / total if total else 0.0,
+        'narrowed_share': narrowed / total if total else 0.0
+    }
+
+def run(kb: MathKnowledgeBase, queries: List[Dict[str, str]], n_results: int = 2, threshold: float = 0.6) -> dict:
+    # Embed once up front so both modes time only classification and the index query
+    embeddings = kb.embedding_function([query['question'] for query in queries]) if queries else []
+    return {
+        'documents': kb.collection.count(),
+        'queries': len(queries),
+        'unfiltered': run_mode(kb, queries, embeddings, False, n_results, threshold),
+        'filtered': run_mode(kb, queries, embeddings, True, n_results, threshold)
+    }
+
+def format_report(report: dict) -> str:
+    lines = [
+        "🗂️ KB Search: category-filtered vs unfiltered",
+        "=" * 60,
+        f"Documents: {report['documents']}, queries: {report['queries']}, "
+        f"narrowed by classifier: {report['filtered']['narrowed_share']:.1%}",
+        f"{'mode':>11} {'mean ms':>9} {'p95 ms':>9} {'recall':>8} {'false match':>12}"
+    ]
+    for mode in ('unfiltered', 'filtered'):
+        result = report[mode]
+        lines.append(f"{mode:>11} {result['mean_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+                     f"{result['recall']:>8.1%} {result['false_match_rate']:>12.1%}")
+    return "\n".join(lines)
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Compare category-filtered and unfiltered KB search latency and recall")
+    parser.add_argument("--persist-directory", default=KB_PERSIST_DIRECTORY, help="ChromaDB directory to query")
+    parser.add_argument("--queries", help='JSON list of {"question", "expected_question"}; defaults to the stored questions')
+    parser.add_argument("--n-results", type=int, default=2, help="neighbours per query, as in search()")
+    parser.add_argument("--threshold", type=float, default=0.6, help="match distance threshold, as in search()")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    kb = MathKnowledgeBase(args.persist_directory)
+    queries = load_queries(kb, args.queries)
+    print(format_report(run(kb, queries, args.n_results, args.threshold)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,11 +2,37 @@ import chromadb
 from chromadb.config import Settings
 from chromadb.utils import embedding_functions
 from dotenv import load_dotenv
+from response_cache import response_cache, normalize_question
+from semantic_cache import semantic_cache
+from query_classifier import query_classifier
+import atexit
+import hashlib
+import json
 import os
-import uuid
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
 
 load_dotenv()
 
+# Set KB_PERSIST_DIRECTORY to an empty string for a throwaway in-memory store
+KB_PERSIST_DIRECTORY = os.getenv("KB_PERSIST_DIRECTORY", "./chroma_db")
+SEED_SOURCE = "enhanced_knowledge_base"
+
+# Corrections are written in batches of up to this many, or after this many seconds
+CORRECTION_BATCH_SIZE = int(os.getenv("KB_CORRECTION_BATCH_SIZE", "32"))
+CORRECTION_FLUSH_SECONDS = float(os.getenv("KB_CORRECTION_FLUSH_SECONDS", "5"))
+
+# kb_compaction builds the compacted copy under the first suffix and parks the live
+# collection under the second until the rebuilt one has been renamed into place
+COMPACTING_SUFFIX = "_compacting"
+BACKUP_SUFFIX = "_backup"
+
+# Restrict KB searches to the question's predicted topic when the classifier is confident
+CATEGORY_FILTER = os.getenv("KB_CATEGORY_FILTER", "true").lower() == "true"
+# Collection metadata flag set once every stored document has a category
+CATEGORIES_BACKFILLED_KEY = "categories_backfilled"
+
 math_qa_pairs = [
     {
         "question": "What is the Pythagorean theorem?",
@@ -76,100 +102,406 @@ advanced_calculus = [
     }
 ]
 
+def seed_item_id(qa: dict) -> str:
+    """Stable id derived from the item's content, so edited items get a new id"""
+    digest = hashlib.sha256(json.dumps(qa, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+    return f"seed_{digest[:16]}"
+
+def build_kb_document(qa: dict) -> tuple[str, dict]:
+    """Document text and Chroma-compatible metadata for a question/answer item"""
+    # Create rich document text
+    document_text = f"""
+            Question: {qa['question']}
+            Answer: {qa['answer']}
+            Category: {qa.get('category', 'general')}
+            Difficulty: {qa.get('difficulty', 'medium')}
+            Tags: {', '.join(qa.get('tags', []))}
+            """
+
+    # Convert lists to strings for ChromaDB compatibility
+    tags = qa.get('tags', [])
+    tags_str = ', '.join(tags) if tags else 'none'
+
+    metadata = {
+        "question": qa['question'],
+        "category": qa.get('category') or query_classifier.classify(qa['question'])[0] or 'general',
+        "difficulty": qa.get('difficulty', 'medium'),
+        "tags": tags_str,  # Convert list to string
+        "source": SEED_SOURCE
+    }
+    return document_text, metadata
+
+def backfill_categories(collection, batch_size: int = 1000) -> int:
+    """Give a category to documents stored before searches filtered on it (e.g. older corrections).
+
+    The category filter would otherwise hide them. Chroma cannot query for a
+    missing key, so metadata is scanned page by page; returns the number updated.
+    """
+    updated = 0
+    offset = 0
+    while True:
+        page = collection.get(limit=batch_size, offset=offset, include=["metadatas", "documents"])
+        if not page['ids']:
+            return updated
+        ids, metadatas = [], []
+        for item_id, metadata, document in zip(page['ids'], page['metadatas'], page['documents']):
+            metadata = metadata or {}
+            if metadata.get('category'):
+                continue
+            question = metadata.get('question') or document or ""
+            ids.append(item_id)
+            metadatas.append({**metadata, 'category': query_classifier.classify(question)[0] or 'general'})
+        if ids:
+            collection.update(ids=ids, metadatas=metadatas)
+            updated += len(ids)
+        offset += len(page['ids'])
+
+def migrate_categories(collection) -> int:
+    """Run backfill_categories once per collection; later starts only read the marker.
+
+    Every writer stores a category, so after one pass nothing is left to fill.
+    """
+    metadata = collection.metadata or {}
+    if metadata.get(CATEGORIES_BACKFILLED_KEY):
+        return 0
+    updated = backfill_categories(collection)
+    collection.modify(metadata={**metadata, CATEGORIES_BACKFILLED_KEY: True})
+    return updated
+
+def recover_interrupted_compaction(client, name: str) -> Optional[str]:
+    """Clean up after a compaction that stopped mid-swap; returns what was done, or None.
+
+    A backup without a live collection means the crash came between the two
+    renames, so the backup (the untouched original) is renamed back. A backup
+    next to a live collection means the swap finished and only the drop was
+    missed. A leftover compacted copy is always discarded.
+    """
+    names = {collection.name for collection in client.list_collections()}
+    backup, compacting = name + BACKUP_SUFFIX, name + COMPACTING_SUFFIX
+    action = None
+    if backup in names:
+        if name in names:
+            client.delete_collection(backup)
+            action = "dropped the pre-compaction backup"
+        else:
+            client.get_collection(backup).modify(name=name)
+            action = "restored the pre-compaction collection"
+    if compacting in names:
+        client.delete_collection(compacting)
+        action = action or "dropped an unfinished compacted copy"
+    return action
+
+def correction_id(question: str) -> str:
+    """Stable id for a question's correction, so re-corrections overwrite it"""
+    digest = hashlib.sha256(normalize_question(question).encode("utf-8")).hexdigest()
+    return f"corrected_{digest[:16]}"
+
+class CorrectionBuffer:
+    """Write-behind buffer for corrected answers.
+
+    Corrections are collected and written with one bulk ``upsert`` (one
+    embedding batch) when ``batch_size`` are pending or ``flush_seconds``
+    after the oldest one arrived. A correction of a question still pending
+    replaces the earlier one. Pending corrections are flushed by
+    ``close()``, which also runs at interpreter exit.
+    """
+
+    def __init__(self, collection, batch_size: int = CORRECTION_BATCH_SIZE,
+                 flush_seconds: float = CORRECTION_FLUSH_SECONDS):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._pending: Dict[str, Tuple[str, dict]] = {}
+        self._oldest_pending: Optional[float] = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._flusher: Optional[threading.Thread] = None
+        self.flushed_batches = 0
+        self.flushed_documents = 0
+        self.replaced_pending = 0
+        self.failed_flushes = 0
+
+    def add(self, item_id: str, document: str, metadata: dict):
+        with self._lock:
+            if item_id in self._pending:
+                self.replaced_pending += 1
+            self._pending[item_id] = (document, metadata)
+            if self._oldest_pending is None:
+                self._oldest_pending = time.monotonic()
+            full = len(self._pending) >= self.batch_size
+            self._start_flusher()
+        if full:
+            self.flush()
+
+    def _start_flusher(self):
+        if self._flusher is None and not self._closed:
+            self._flusher = threading.Thread(target=self._run_flusher, name="kb-correction-flusher", daemon=True)
+            self._flusher.start()
+            atexit.register(self.close)
+
+    def _run_flusher(self):
+        while not self._closed:
+            self._wake.wait(self.flush_seconds / 2)
+            oldest = self._oldest_pending
+            if oldest is not None and time.monotonic() - oldest >= self.flush_seconds:
+                self.flush()
+
+    def flush(self) -> int:
+        """Write all pending corrections now; returns how many were written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._oldest_pending = None
+            if not batch:
+                return 0
+
+            ids = list(batch)
+            try:
+                self.collection.upsert(
+                    ids=ids,
+                    documents=[batch[item_id][0] for item_id in ids],
+                    metadatas=[batch[item_id][1] for item_id in ids]
+                )
+            except Exception as e:
+                print(f"⚠️ Writing {len(ids)} corrections failed, will retry: {e}")
+                self.failed_flushes += 1
+                with self._lock:
+                    # Put the batch back, unless newer corrections arrived meanwhile
+                    for item_id in ids:
+                        self._pending.setdefault(item_id, batch[item_id])
+                    if self._oldest_pending is None:
+                        self._oldest_pending = time.monotonic()
+                return 0
+
+            self.flushed_batches += 1
+            self.flushed_documents += len(ids)
+            print(f"✅ Wrote {len(ids)} corrected answers to the knowledge base")
+            return len(ids)
+
+    def close(self):
+        """Stop the background flusher and write whatever is pending"""
+        self._closed = True
+        self._wake.set()
+        if self._flusher is not None and self._flusher is not threading.current_thread():
+            self._flusher.join(timeout=5)
+        self.flush()
+
+    def stats(self) -> dict:
+        return {
+            'pending': len(self._pending),
+            'flushed_batches': self.flushed_batches,
+            'flushed_documents': self.flushed_documents,
+            'replaced_pending': self.replaced_pending,
+            'failed_flushes': self.failed_flushes
+        }
+
 class MathKnowledgeBase:
-    def __init__(self):
+    def __init__(self, persist_directory: str = KB_PERSIST_DIRECTORY, category_filter: bool = CATEGORY_FILTER):
+        started = time.perf_counter()
         self.embedding_function = embedding_functions.DefaultEmbeddingFunction()
-        self.client = chromadb.Client(Settings(
-            anonymized_telemetry=False,
-            persist_directory="./chroma_db"
-        ))
+        if persist_directory:
+            self.client = chromadb.PersistentClient(
+                path=persist_directory,
+                settings=Settings(anonymized_telemetry=False)
+            )
+        else:
+            self.client = chromadb.Client(Settings(anonymized_telemetry=False))
+        recovered = recover_interrupted_compaction(self.client, "math_knowledge")
+        if recovered:
+            print(f"♻️ Knowledge base: {recovered} left by an interrupted compaction")
         self.collection = self.client.get_or_create_collection(
             name="math_knowledge",
             embedding_function=self.embedding_function
         )
 
-        if self.collection.count() == 0:
-            self._populate_kb()
+        self.corrections = CorrectionBuffer(self.collection)
+        self.category_filter = category_filter
+        self.search_stats = {'filtered': 0, 'unfiltered': 0}
+
+        self.seed_stats = self._populate_kb()
+        self.seed_stats['categories_backfilled'] = migrate_categories(self.collection)
+        if self.seed_stats['categories_backfilled']:
+            print(f"✅ Added a category to {self.seed_stats['categories_backfilled']} documents stored without one")
+        self.startup_seconds = time.perf_counter() - started
+        print(f"⏱️ Knowledge base ready in {self.startup_seconds:.2f}s "
+              f"({self.collection.count()} documents, {self.seed_stats['added']} newly embedded)")
 
-    def _populate_kb(self):
-        """Populate knowledge base with enhanced dataset"""
+    def _populate_kb(self) -> dict:
+        """Incrementally seed the knowledge base with the enhanced dataset.
+
+        Only seed items whose content hash is not stored yet are embedded;
+        seed documents that no longer match any item are removed.
+        """
         # COMBINE ALL QUESTIONS: basic + bonus datasets
         all_questions = math_qa_pairs + jee_advanced_questions + imo_questions + advanced_calculus
-        
-        documents = []
-        metadatas = []
-        ids = []
-        
-        for i, qa in enumerate(all_questions):
-            # Create rich document text
-            document_text = f"""
-            Question: {qa['question']}
-            Answer: {qa['answer']}
-            Category: {qa.get('category', 'general')}
-            Difficulty: {qa.get('difficulty', 'medium')}
-            Tags: {', '.join(qa.get('tags', []))}
-            """
-            
-            documents.append(document_text)
-            
-            # Convert lists to strings for ChromaDB compatibility
-            tags = qa.get('tags', [])
-            tags_str = ', '.join(tags) if tags else 'none'
-            
-            metadatas.append({
-                "question": qa['question'],
-                "category": qa.get('category', 'general'),
-                "difficulty": qa.get('difficulty', 'medium'),
-                "tags": tags_str,  # Convert list to string
-                "source": "enhanced_knowledge_base"
-            })
-            ids.append(f"math_qa_{i}")
-        
-        self.collection.add(
-            documents=documents,
-            metadatas=metadatas,
-            ids=ids
-        )
-        print(f"✅ Knowledge base populated with {len(documents)} items (including bonus dataset)")
+        seed_items = {seed_item_id(qa): qa for qa in all_questions}
+
+        stored_ids = set(self.collection.get(where={"source": SEED_SOURCE}, include=[])['ids'])
+        stale_ids = sorted(stored_ids - set(seed_items))
+        new_ids = [item_id for item_id in seed_items if item_id not in stored_ids]
+
+        if stale_ids:
+            self.collection.delete(ids=stale_ids)
+
+        if new_ids:
+            documents = []
+            metadatas = []
+            for item_id in new_ids:
+                document_text, metadata = build_kb_document(seed_items[item_id])
+                documents.append(document_text)
+                metadatas.append(metadata)
+
+            self.collection.add(
+                documents=documents,
+                metadatas=metadatas,
+                ids=new_ids
+            )
+            print(f"✅ Knowledge base populated with {len(documents)} new items (including bonus dataset)")
+
+        return {
+            'added': len(new_ids),
+            'removed': len(stale_ids),
+            'unchanged': len(seed_items) - len(new_ids)
+        }
+
+    def _where(self, query: str) -> Optional[dict]:
+        where = query_classifier.where_filter(query) if self.category_filter else None
+        self.search_stats['filtered' if where else 'unfiltered'] += 1
+        return where
+
     def search(self, query: str, n_results: int = 2, threshold: float = 0.6):
         try:
             results = self.collection.query(
                 query_texts=[query],
                 n_results=n_results,
+                where=self._where(query),
                 include=["metadatas", "documents", "distances"]
             )
-            
-            if (results['documents'] and results['documents'][0] and 
-                results['distances'] and results['distances'][0] and 
-                results['distances'][0][0] < threshold):
-                
-                best_doc = results['documents'][0][0]
-                best_metadata = results['metadatas'][0][0]
-                
-                return best_metadata.get('question'), {
-                    'answer': best_doc,
-                    'metadata': best_metadata,
-                    'similarity_score': 1 - results['distances'][0][0]
-                }
-            
-            return None, None
+            return self._best_match(results, 0, threshold)
             
         except Exception as e:
             print(f"Knowledge base search error: {e}")
             return None, None
 
+    def search_many(self, queries: List[str], n_results: int = 2, threshold: float = 0.6,
+                    batch_size: int = 256) -> List[Tuple[Optional[str], Optional[dict]]]:
+        """Batched search: one embedding + query call per batch of queries with the same category filter.
+
+        Returns one (question, answer) pair per query, in order, with the
+        same shape as search().
+        """
+        groups: Dict[str, List[int]] = {}
+        filters: Dict[str, Optional[dict]] = {}
+        for index, query in enumerate(queries):
+            where = self._where(query)
+            key = json.dumps(where, sort_keys=True)
+            groups.setdefault(key, []).append(index)
+            filters[key] = where
+
+        matches: List[Tuple[Optional[str], Optional[dict]]] = [(None, None)] * len(queries)
+        for key, indexes in groups.items():
+            for offset in range(0, len(indexes), batch_size):
+                batch = indexes[offset:offset + batch_size]
+                try:
+                    results = self.collection.query(
+                        query_texts=[queries[i] for i in batch],
+                        n_results=n_results,
+                        where=filters[key],
+                        include=["metadatas", "documents", "distances"]
+                    )
+                    for position, index in enumerate(batch):
+                        matches[index] = self._best_match(results, position, threshold)
+                except Exception as e:
+                    print(f"Knowledge base batch search error: {e}")
+        return matches
+
+    @staticmethod
+    def _best_match(results: dict, index: int, threshold: float):
+        """Pick the closest document for the index-th query if it is under the threshold"""
+        if (results['documents'] and results['documents'][index] and 
+            results['distances'] and results['distances'][index] and 
+            results['distances'][index][0] < threshold):
+            
+            best_doc = results['documents'][index][0]
+            best_metadata = results['metadatas'][index][0]
+            
+            return best_metadata.get('question'), {
+                'answer': best_doc,
+                'metadata': best_metadata,
+                'similarity_score': 1 - results['distances'][index][0]
+            }
+        
+        return None, None
+
     def add_corrected_answer(self, question: str, answer: str, metadata: dict = None):
+        """Queue a corrected answer; it replaces any earlier correction of the same question"""
         document_text = f"Question: {question}. Answer: {answer}"
-        
-        self.collection.add(
-            documents=[document_text],
-            metadatas=[metadata or {
+        self.corrections.add(
+            correction_id(question),
+            document_text,
+            {
                 "question": question,
+                "category": query_classifier.classify(question)[0] or "general",
                 "source": "human_corrected",
-                "corrected": True
-            }],
-            ids=[f"corrected_{str(uuid.uuid4())[:8]}"]
+                "corrected": True,
+                "corrected_at": time.time(),
+                **(metadata or {})
+            }
         )
-        print(f"✅ Added corrected answer to knowledge base: {question}")
+        # Cached answers for this question are now stale
+        response_cache.invalidate_question(question)
+        semantic_cache.invalidate_question(question)
+        print(f"✅ Queued corrected answer for the knowledge base: {question}")
+
+_math_kb_instance = None
+_math_kb_lock = threading.Lock()
+
+def get_math_kb() -> MathKnowledgeBase:
+    """Return the global knowledge base, building it on first use"""
+    global _math_kb_instance
+    if _math_kb_instance is None:
+        with _math_kb_lock:
+            if _math_kb_instance is None:
+                _math_kb_instance = MathKnowledgeBase()
+    return _math_kb_instance
+
+def is_math_kb_ready() -> bool:
+    return _math_kb_instance is not None
+
+def warm_up_knowledge_base() -> float:
+    """Build the knowledge base and load the embedding model; returns seconds taken"""
+    started = time.perf_counter()
+    # A query forces the ONNX embedding model to load, not just the collection
+    get_math_kb().search("warm up")
+    return time.perf_counter() - started
+
+def flush_pending_corrections() -> int:
+    """Write buffered corrections now (e.g. on shutdown); a no-op if the KB was never built"""
+    if _math_kb_instance is None:
+        return 0
+    return _math_kb_instance.corrections.flush()
+
+def correction_stats() -> dict:
+    if _math_kb_instance is None:
+        return {}
+    return _math_kb_instance.corrections.stats()
+
+def search_filter_stats() -> dict:
+    """How many KB searches were narrowed to a predicted category"""
+    if _math_kb_instance is None:
+        return {}
+    return dict(_math_kb_instance.search_stats)
+
+class _LazyKnowledgeBase:
+    """Stand-in for the global knowledge base that builds it on first attribute access.
+
+    Importing this module stays cheap; the embedding model, Chroma client
+    and seeding only run when the knowledge base is actually used.
+    """
+
+    def __getattr__(self, name):
+        return getattr(get_math_kb(), name)
 
-math_kb = MathKnowledgeBase()
\ No newline at end of file
+math_kb = _LazyKnowledgeBase()
\ No newline at end of file
@@ -0,0 +1,116 @@
+import json
+import os
+from typing import AsyncIterator, Dict, List, Optional
+
+import google.generativeai as genai
+from dotenv import load_dotenv
+from replay_store import replay_backend
+from llm_scheduler import llm_scheduler
+
+load_dotenv()
+
+DEFAULT_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+
+class LLMClient:
+    """Shared async Gemini client.
+
+    Model objects are built once per (model, generation config, safety
+    settings) combination and reused, and all generation goes through the
+    SDK's async API so a slow call never blocks the event loop. Live calls
+    are admitted by the global LLM scheduler (rate limit, concurrency cap,
+    priorities, 429/5xx retries).
+    """
+
+    def __init__(self, default_model: str = DEFAULT_MODEL):
+        self.default_model = default_model
+        self._models: Dict[str, genai.GenerativeModel] = {}
+        self._configured = False
+
+    def _configure(self):
+        # Deferred so importing the client costs nothing until the first call
+        if not self._configured:
+            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+            self._configured = True
+
+    @property
+    def is_ready(self) -> bool:
+        return self._configured and bool(self._models)
+
+    def get_model(
+        self,
+        model_name: Optional[str] = None,
+        generation_config: Optional[Dict] = None,
+        safety_settings: Optional[List[Dict]] = None,
+    ) -> genai.GenerativeModel:
+        """Return a cached model object for this configuration"""
+        model_name = model_name or self.default_model
+        key = json.dumps([model_name, generation_config, safety_settings], sort_keys=True)
+
+        model = self._models.get(key)
+        if model is None:
+            self._configure()
+            model = genai.GenerativeModel(
+                model_name,
+                generation_config=generation_config,
+                safety_settings=safety_settings,
+            )
+            self._models[key] = model
+        return model
+
+    async def generate(
+        self,
+        prompt: str,
+        model_name: Optional[str] = None,
+        generation_config: Optional[Dict] = None,
+        safety_settings: Optional[List[Dict]] = None,
+    ) -> str:
+        """Generate a completion without blocking the event loop"""
+        request = self._replay_request(prompt, model_name, generation_config, safety_settings)
+        if replay_backend.replaying:
+            await replay_backend.llm_latency.wait()
+            return replay_backend.store.get("llm", request)
+
+        model = self.get_model(model_name, generation_config, safety_settings)
+        response = await llm_scheduler.run(lambda: model.generate_content_async(prompt))
+        if replay_backend.recording:
+            await replay_backend.store.put("llm", request, response.text)
+        return response.text
+
+    async def stream(
+        self,
+        prompt: str,
+        model_name: Optional[str] = None,
+        generation_config: Optional[Dict] = None,
+        safety_settings: Optional[List[Dict]] = None,
+    ) -> AsyncIterator[str]:
+        """Yield completion text chunks as the model produces them"""
+        request = self._replay_request(prompt, model_name, generation_config, safety_settings)
+        if replay_backend.replaying:
+            await replay_backend.llm_latency.wait()
+            words = replay_backend.store.get("llm", request).split(" ")
+            for i in range(0, len(words), 8):
+                yield " ".join(words[i:i + 8]) + (" " if i + 8 < len(words) else "")
+            return
+
+        model = self.get_model(model_name, generation_config, safety_settings)
+        recorded = []
+        async with llm_scheduler.slot(lambda: model.generate_content_async(prompt, stream=True)) as response:
+            async for chunk in response:
+                if chunk.text:
+                    recorded.append(chunk.text)
+                    yield chunk.text
+        if replay_backend.recording:
+            await replay_backend.store.put("llm", request, "".join(recorded))
+
+    def _replay_request(self, prompt: str, model_name: Optional[str],
+                        generation_config: Optional[Dict], safety_settings: Optional[List[Dict]]) -> Dict:
+        """Everything that determines a completion, used as the record/replay key"""
+        return {
+            'model': model_name or self.default_model,
+            'generation_config': generation_config,
+            'safety_settings': safety_settings,
+            'prompt': prompt
+        }
+
+# Global LLM client instance
+llm_client = LLMClient()
@@ -0,0 +1,227 @@
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple, TypeVar
+
+from metrics import LLM_QUEUE_WAIT_SECONDS
+
+T = TypeVar("T")
+
+# Lower rank is served first; interactive /ask traffic goes ahead of everything else
+PRIORITIES = {"interactive": 0, "batch": 1, "benchmark": 2, "feedback": 3}
+
+_current_priority: ContextVar[str] = ContextVar("llm_priority", default="interactive")
+
+@contextmanager
+def llm_priority(priority: str):
+    """Run the enclosed LLM calls (and tasks started inside) at ``priority``"""
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown LLM priority {priority!r}")
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+def current_priority() -> str:
+    return _current_priority.get()
+
+def retry_status(error: Exception) -> Optional[int]:
+    """HTTP status of a retryable error (429 or 5xx), or None"""
+    for attribute in ("code", "status", "status_code"):
+        status = getattr(error, attribute, None)
+        if isinstance(status, int) and (status == 429 or 500 <= status < 600):
+            return status
+    return None
+
+class LLMScheduler:
+    """Admission control for every Gemini call.
+
+    A call waits for a free slot (at most ``max_concurrency`` in flight)
+    and a token from a bucket refilled at ``rate_per_minute`` (holding up
+    to ``burst``). Waiters are served by priority class, then in arrival
+    order. 429 and 5xx errors are retried with jittered exponential
+    backoff; a 429 also empties the bucket so other callers slow down.
+    """
+
+    def __init__(self, rate_per_minute: float = 60.0, burst: int = 10, max_concurrency: int = 8,
+                 max_retries: int = 4, base_delay: float = 1.0, max_delay: float = 30.0):
+        self.rate_per_minute = rate_per_minute
+        self.burst = max(1, burst)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+        self._active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.queued = {priority: 0 for priority in PRIORITIES}
+        self.granted = {priority: 0 for priority in PRIORITIES}
+        self.wait_seconds_total = {priority: 0.0 for priority in PRIORITIES}
+        self.max_wait_seconds = 0.0
+        self.retries = 0
+        self.rate_limited = 0
+        self.server_errors = 0
+        self.failed = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate_per_minute > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate_per_minute / 60)
+        self._refilled_at = now
+
+    def _can_start(self) -> bool:
+        return self._active < self.max_concurrency and (self.rate_per_minute <= 0 or self._tokens >= 1)
+
+    def _start(self):
+        self._active += 1
+        if self.rate_per_minute > 0:
+            self._tokens -= 1
+
+    def _dispatch(self) -> Optional[float]:
+        """Hand free slots to the best waiters; returns seconds until the next token if one is short"""
+        self._refill()
+        while self._waiters and self._active < self.max_concurrency:
+            future = self._waiters[0][2]
+            if future.done():  # cancelled while waiting
+                heapq.heappop(self._waiters)
+                continue
+            if not self._can_start():
+                return (1 - self._tokens) * 60 / self.rate_per_minute
+            heapq.heappop(self._waiters)
+            self._start()
+            future.set_result(None)
+        return None
+
+    def _wake(self):
+        """Dispatch now, and again when the next token is due if the bucket is empty"""
+        delay = self._dispatch()
+        if delay is None:
+            return
+        loop = asyncio.get_running_loop()
+        if self._timer is not None and self._timer_loop is loop and self._timer.when() > loop.time():
+            return  # a wake-up is already scheduled
+        self._timer_loop = loop
+        self._timer = loop.call_later(delay, self._wake)
+
+    def _release(self):
+        self._active -= 1
+        self._wake()
+
+    async def _acquire(self, priority: str):
+        started = time.monotonic()
+        self._refill()
+        if not self._waiters and self._can_start():
+            self._start()
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (PRIORITIES[priority], next(self._sequence), future))
+            self.queued[priority] += 1
+            try:
+                self._wake()
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self._release()  # granted just as the caller went away
+                else:
+                    future.cancel()
+                raise
+            finally:
+                self.queued[priority] -= 1
+
+        waited = time.monotonic() - started
+        self.granted[priority] += 1
+        self.wait_seconds_total[priority] += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        LLM_QUEUE_WAIT_SECONDS.observe(waited, priority=priority)
+
+    def _backoff_delay(self, attempt: int) -> float:
+        # Full jitter: uniform in [0, min(max_delay, base * 2^attempt)]
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    @asynccontextmanager
+    async def slot(self, call: Callable[[], Awaitable[T]]) -> AsyncIterator[T]:
+        """Run ``call`` once admitted (retrying 429/5xx) and hold the slot until the block exits.
+
+        Streaming calls keep the slot while their chunks are read; only
+        opening the stream is retried.
+        """
+        priority = current_priority()
+        attempt = 0
+        while True:
+            await self._acquire(priority)
+            try:
+                result = await call()
+            except Exception as e:
+                status = retry_status(e)
+                if status == 429:
+                    self.rate_limited += 1
+                    self._tokens = min(self._tokens, 0.0)
+                elif status is not None:
+                    self.server_errors += 1
+                self._release()
+                if status is None or attempt >= self.max_retries:
+                    self.failed += 1
+                    raise
+                delay = self._backoff_delay(attempt)
+                print(f"⚠️ Gemini returned {status}, retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries})")
+                self.retries += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled mid-request (client disconnect, worker shutdown): free the slot
+                self._release()
+                raise
+            try:
+                yield result
+            finally:
+                self._release()
+            return
+
+    async def run(self, call: Callable[[], Awaitable[T]]) -> T:
+        async with self.slot(call) as result:
+            return result
+
+    def stats(self) -> dict:
+        self._refill()
+        granted = sum(self.granted.values())
+        stats = {
+            'rate_limit_rpm': self.rate_per_minute,
+            'max_concurrency': self.max_concurrency,
+            'active': self._active,
+            'tokens_available': max(0.0, self._tokens) if self.rate_per_minute > 0 else float(self.burst),
+            'queue_depth': sum(self.queued.values()),
+            'granted': granted,
+            'mean_wait_seconds': sum(self.wait_seconds_total.values()) / granted if granted else 0.0,
+            'max_wait_seconds': self.max_wait_seconds,
+            'retries': self.retries,
+            'rate_limited': self.rate_limited,
+            'server_errors': self.server_errors,
+            'failed': self.failed
+        }
+        for priority in PRIORITIES:
+            stats[f'queue_depth_{priority}'] = self.queued[priority]
+            stats[f'mean_wait_seconds_{priority}'] = (
+                self.wait_seconds_total[priority] / self.granted[priority] if self.granted[priority] else 0.0
+            )
+        return stats
+
+# Global scheduler shared by every LLM call; LLM_RATE_LIMIT_RPM=0 disables the rate limit
+llm_scheduler = LLMScheduler(
+    rate_per_minute=float(os.getenv("LLM_RATE_LIMIT_RPM", "60")),
+    burst=int(os.getenv("LLM_RATE_BURST", "10")),
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", "4")),
+    base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY", "1.0")),
+    max_delay=float(os.getenv("LLM_RETRY_MAX_DELAY", "30"))
+)
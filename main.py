@@ -1,17 +1,29 @@
 import os
 from crewai import Agent, Task, Crew
 from crewai.tools import BaseTool
-from knowledge_base import math_kb
-from human_feedback import get_human_feedback, is_human_feedback_available
+from knowledge_base import math_kb, is_math_kb_ready, warm_up_knowledge_base
+from human_feedback import get_human_feedback, is_human_feedback_available, FEEDBACK_ENHANCED_HEADER
+from feedback_queue import feedback_queue
 from mcp_client import mcp_client_instance
 from output_guardrails import output_guardrails
+from guardrail_engine import guardrail_engine
+from response_cache import response_cache, normalize_question
+from request_coalescer import SingleFlight
+from tracing import start_trace, stage, annotate
+from metrics import record_trace
+from semantic_cache import semantic_cache
+from llm_client import llm_client
+from evaluator import evaluation_router, format_evaluation
+from symbolic_solver import symbolic_solver, SOURCE as SYMBOLIC_SOURCE
+from llm_scheduler import llm_priority
 from dotenv import load_dotenv
-import google.generativeai as genai
 import aiohttp
+import json
 import re
+import time
 import asyncio      
+from typing import AsyncIterator, Awaitable, List, Optional, Tuple
 load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 
 # Replace the MCPSearchTool class with this updated version
 from mcp_client import mcp_client_instance
@@ -37,86 +49,434 @@ class MCPSearchTool(BaseTool):
 # Create tool instance
 mcp_tool = MCPSearchTool()
 
+# Start the MCP search together with the KB lookup and cancel it on a KB hit
+SPECULATIVE_MCP = os.getenv("SPECULATIVE_MCP", "false").lower() == "true"
+
+routing_stats = {
+    'kb_hits': 0,
+    'mcp_searches': 0,
+    'kb_seconds_total': 0.0,
+    'mcp_seconds_total': 0.0,
+    'speculative_started': 0,
+    'speculation_used': 0,
+    'speculation_wasted': 0,
+    'speculation_cancelled_in_flight': 0,
+    'speculation_overlap_seconds_total': 0.0,
+    'self_graded_answers': 0,
+    'self_graded_parse_failures': 0
+}
+
+def get_routing_stats() -> dict:
+    stats = dict(routing_stats)
+    stats['speculative_mcp'] = SPECULATIVE_MCP
+    stats['pipeline_mode'] = PIPELINE_MODE
+    started = stats['speculative_started']
+    stats['speculation_waste_rate'] = stats['speculation_wasted'] / started if started else 0.0
+    return stats
+
+# "two_call": generate, then evaluate in a second call; "self_graded": one JSON call returns both
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "two_call").lower()
+SELF_GRADED_GENERATION_CONFIG = {"response_mime_type": "application/json"}
+
+# Max questions of one /ask/batch request generating with Gemini at the same time
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+
 # SIMPLE GEMINI CALL
-def gemini_call(prompt: str) -> str:
-    """Simple Gemini call"""
+async def gemini_call(prompt: str, generation_config: Optional[dict] = None) -> str:
+    """Gemini call through the shared async client"""
     try:
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        response = model.generate_content(prompt)
-        return response.text if response.text else "I don't have enough information to answer this question."
+        text = await llm_client.generate(prompt, generation_config=generation_config)
+        return text if text else "I don't have enough information to answer this question."
     except Exception as e:
         return f"Error: {str(e)}"
 
+async def gemini_stream(prompt: str) -> AsyncIterator[str]:
+    """Streaming Gemini call; errors surface as a single "Error: ..." chunk like gemini_call"""
+    produced = False
+    try:
+        async for text in llm_client.stream(prompt):
+            produced = True
+            yield text
+    except Exception as e:
+        yield f"\n\nError: {str(e)}" if produced else f"Error: {str(e)}"
+        return
+    if not produced:
+        yield "I don't have enough information to answer this question."
+
 def validate_input_guardrails(input_text: str) -> tuple[bool, str]:
-    if not input_text or len(input_text.strip()) < 3:
-        return False, "Query too short. Please provide a complete question."
-    
-    math_keywords = [
-        'calculate', 'solve', 'equation', 'derivative', 'integral', 
-        'algebra', 'geometry', 'theorem', 'formula', 'math', 'probability',
-        'trigonometry', 'calculus', 'matrix', 'vector', 'statistics'
-    ]
-    
-    input_lower = input_text.lower()
-    has_math_content = any(keyword in input_lower for keyword in math_keywords)
-    
-    if not has_math_content:
-        return False, "This system only processes mathematics-related queries. Please ask a math question."
-    
-    return True, ""
+    return guardrail_engine.validate_input(input_text)
 
 def contains_uncertainty(response: str) -> bool:
-    uncertainty_phrases = [
-        "i don't know", "i cannot", "not sure", "uncertain", 
-        "no information", "not found", "unable to", "don't have"
-    ]
-    response_lower = response.lower()
-    return any(phrase in response_lower for phrase in uncertainty_phrases)
+    return guardrail_engine.contains_uncertainty(response)
+
+NO_INFORMATION_ANSWER = "I don't have enough information to answer this question accurately. The topic may be too specialized or I need more context."
+REVIEW_UNAVAILABLE_ANSWER = "I need human review for this answer, but the feedback system is currently unavailable. Please try again later or ask a different question."
 
 async def math_agent_query(user_question: str) -> str:
+    result = await math_agent_query_detailed(user_question)
+    return result['answer']
+
+async def math_agent_query_detailed(user_question: str, use_cache: bool = True) -> dict:
+    """Answer a question and return structured pipeline data alongside it.
+
+    The result holds ``answer``, the routing ``source``, the evaluation
+    ``verdict`` and a ``trace`` with per-stage timings and routing details.
+    ``use_cache=False`` skips the answer caches (e.g. for benchmarking).
+    """
+    with start_trace(user_question) as trace:
+        result = await _answer_question(user_question, use_cache)
+        annotate('source', result['source'])
+        annotate('verdict', result['verdict'])
+    result['trace'] = trace.to_dict()
+    record_trace(result['trace'])
+    return result
+
+async def _answer_question(user_question: str, use_cache: bool) -> dict:
     # 1. INPUT GUARDRAIL
+    with stage("input_guardrail"):
+        is_valid, message = validate_input_guardrails(user_question)
+    if not is_valid:
+        return _pipeline_result(f"Error: {message}", source="Guardrail", verdict="rejected")
+
+    # 1a. SYMBOLIC FAST PATH (routine derivatives, equations and integrals, no LLM)
+    symbolic_answer = await _try_symbolic(user_question)
+    if symbolic_answer is not None:
+        return _pipeline_result(symbolic_answer, source=SYMBOLIC_SOURCE, verdict="solved")
+
+    # 1b. RESPONSE CACHES (exact match, then paraphrases of approved questions)
+    if use_cache:
+        cached_answer = await _lookup_cached_answer(user_question)
+        if cached_answer is not None:
+            return _pipeline_result(cached_answer, source="Cache", verdict="cached")
+
+    result = await _run_pipeline(user_question)
+    if result['cacheable'] and use_cache:
+        await _store_cached_answer(user_question, result['answer'])
+    return result
+
+async def math_agent_stream(user_question: str) -> AsyncIterator[dict]:
+    """Streaming variant of math_agent_query.
+
+    Yields ``{"event": ..., "data": ...}`` dicts: a ``route`` event with the
+    chosen source, ``token`` events with sanitized solution text as Gemini
+    produces it, and a ``final`` event carrying the evaluation verdict and,
+    if the answer was replaced (e.g. by human feedback), the replacement.
+    """
     is_valid, message = validate_input_guardrails(user_question)
     if not is_valid:
-        return f"Error: {message}"
+        yield {"event": "final", "data": {"verdict": "rejected", "replacement": f"Error: {message}"}}
+        return
+
+    symbolic_answer = await _try_symbolic(user_question)
+    if symbolic_answer is not None:
+        yield {"event": "route", "data": {"source": SYMBOLIC_SOURCE}}
+        yield {"event": "token", "data": symbolic_answer}
+        yield {"event": "final", "data": {"verdict": "solved", "replacement": None}}
+        return
+
+    cached_answer = await _lookup_cached_answer(user_question)
+    if cached_answer is not None:
+        yield {"event": "route", "data": {"source": "Cache"}}
+        yield {"event": "token", "data": cached_answer}
+        yield {"event": "final", "data": {"verdict": "cached", "replacement": None}}
+        return
+
+    context, source, early_answer = await _route_context(user_question)
+    yield {"event": "route", "data": {"source": source}}
+    if early_answer is not None:
+        yield {"event": "final", "data": {"verdict": "no_information", "replacement": early_answer}}
+        return
+
+    sanitizer = output_guardrails.streaming_sanitizer()
+    raw_parts = []
+    async for chunk in gemini_stream(_build_solution_prompt(user_question, source, context)):
+        raw_parts.append(chunk)
+        safe_text = sanitizer.feed(chunk)
+        if safe_text:
+            yield {"event": "token", "data": safe_text}
+    safe_text = sanitizer.flush()
+    if safe_text:
+        yield {"event": "token", "data": safe_text}
+
+    raw_solution = "".join(raw_parts)
+    generation_failed = raw_solution.startswith("Error:")
+    solution, validation_msg = _apply_output_guardrails(raw_solution)
+
+    evaluation = await _evaluate_solution(user_question, solution, source, context, generation_failed)
+    result = await _resolve_evaluation(user_question, solution, source, evaluation, generation_failed)
+    if result['cacheable']:
+        await _store_cached_answer(user_question, result['answer'])
+
+    yield {"event": "final", "data": {
+        "verdict": result['verdict'],
+        "source": result['source'],
+        "note": validation_msg,
+        "feedback_ticket": result.get('feedback_ticket'),
+        "replacement": result['answer'] if result['answer'] != solution else None
+    }}
+
+async def math_agent_batch(questions: List[str], concurrency: Optional[int] = None) -> List[dict]:
+    """Answer a list of questions, returning one result dict per question in order.
+
+    Guardrails and cache lookups run per item, the KB is queried once for
+    all remaining questions, MCP searches run concurrently, and Gemini work
+    is limited to ``concurrency`` questions at a time. A failing item is
+    reported with ``status: "error"`` without affecting the rest. Gemini
+    calls run at batch priority, behind interactive /ask traffic.
+    """
+    with llm_priority("batch"):
+        return await _answer_batch(questions, concurrency)
+
+async def _answer_batch(questions: List[str], concurrency: Optional[int]) -> List[dict]:
+    semaphore = asyncio.Semaphore(concurrency or BATCH_LLM_CONCURRENCY)
+    results: List[Optional[dict]] = [None] * len(questions)
+    # Each item's own time: its steps plus the batched KB lookup it was part of,
+    # but not time spent waiting for other items to finish a stage
+    elapsed = [0.0] * len(questions)
+
+    async def timed(index: int, work: Awaitable):
+        started = time.perf_counter()
+        try:
+            return await work
+        finally:
+            elapsed[index] += time.perf_counter() - started
+
+    def finish(index: int, status: str, answer: Optional[str] = None, **extra):
+        results[index] = {
+            'question': questions[index],
+            'status': status,
+            'answer': answer,
+            'seconds': 0.0,  # filled in once the batch is done
+            **extra
+        }
+
+    # 1. INPUT GUARDRAILS + SYMBOLIC FAST PATH + RESPONSE CACHES
+    valid = []
+    for index, question in enumerate(questions):
+        started = time.perf_counter()
+        is_valid, message = validate_input_guardrails(question)
+        elapsed[index] += time.perf_counter() - started
+        if not is_valid:
+            finish(index, "rejected", f"Error: {message}")
+        else:
+            valid.append(index)
+
+    symbolic = await asyncio.gather(*(timed(i, _try_symbolic(questions[i])) for i in valid), return_exceptions=True)
+    pending = []
+    for index, symbolic_answer in zip(valid, symbolic):
+        if isinstance(symbolic_answer, str):
+            finish(index, "ok", symbolic_answer, source=SYMBOLIC_SOURCE, verdict="solved")
+        else:
+            pending.append(index)
+
+    cached = await asyncio.gather(*(timed(i, _lookup_cached_answer(questions[i])) for i in pending),
+                                  return_exceptions=True)
+    remaining = []
+    for index, cached_answer in zip(pending, cached):
+        if isinstance(cached_answer, str):
+            finish(index, "ok", cached_answer, source="Cache", verdict="cached")
+        else:
+            remaining.append(index)
+
+    # 2. ONE BATCHED KB LOOKUP
+    started = time.perf_counter()
+    kb_results = await asyncio.to_thread(math_kb.search_many, [questions[i] for i in remaining])
+    kb_seconds = time.perf_counter() - started
+    for index in remaining:
+        elapsed[index] += kb_seconds
+
+    # 3-6. ROUTING + GENERATION PER ITEM (repeated questions in a batch run once)
+    duplicates = SingleFlight()
+
+    async def solve(question: str, kb_result: tuple) -> dict:
+        context, source, early_answer = await _route_context(question, kb_result=kb_result)
+        if early_answer is not None:
+            return _pipeline_result(early_answer, source=source, verdict="no_information")
+        async with semaphore:
+            result = await _generate_answer(question, context, source)
+        if result['cacheable']:
+            await _store_cached_answer(question, result['answer'])
+        return result
+
+    async def answer_item(index: int, kb_result: tuple):
+        question = questions[index]
+        try:
+            result = await duplicates.run(normalize_question(question), lambda: solve(question, kb_result))
+            finish(index, "ok", result['answer'], source=result['source'], verdict=result['verdict'],
+                   feedback_ticket=result.get('feedback_ticket'))
+        except Exception as e:
+            print(f"⚠️ Batch item {index} failed: {e}")
+            finish(index, "error", error=str(e))
+
+    await asyncio.gather(*(timed(i, answer_item(i, kb_result)) for i, kb_result in zip(remaining, kb_results)))
+    for index, result in enumerate(results):
+        result['seconds'] = elapsed[index]
+    return results
+
+async def _try_symbolic(user_question: str) -> Optional[str]:
+    with stage("symbolic_solver"):
+        answer = await symbolic_solver.try_answer(user_question)
+    annotate('symbolic', answer.kind if answer else 'miss')
+    return answer.answer if answer else None
+
+async def _lookup_cached_answer(user_question: str) -> Optional[str]:
+    with stage("cache_lookup", cache="exact"):
+        cached_answer = response_cache.get_answer(user_question)
+    if cached_answer is not None:
+        annotate('cache', 'exact')
+        return cached_answer
 
+    try:
+        with stage("cache_lookup", cache="semantic"):
+            semantic_answer = await asyncio.to_thread(semantic_cache.lookup, user_question)
+    except Exception as e:
+        print(f"⚠️ Semantic cache lookup failed: {e}")
+        return None
+    if semantic_answer is not None:
+        annotate('cache', 'semantic')
+        response_cache.store_answer(user_question, semantic_answer)
+    else:
+        annotate('cache', 'miss')
+    return semantic_answer
+
+async def _store_cached_answer(user_question: str, answer: str):
+    response_cache.store_answer(user_question, answer)
+    try:
+        await asyncio.to_thread(semantic_cache.store, user_question, answer)
+    except Exception as e:
+        print(f"⚠️ Semantic cache store failed: {e}")
+
+def _pipeline_result(answer: str, source: str, verdict: str, cacheable: bool = False) -> dict:
+    return {'answer': answer, 'source': source, 'verdict': verdict, 'cacheable': cacheable}
+
+async def _run_pipeline(user_question: str) -> dict:
+    """Route, generate and evaluate an answer for an already validated question"""
+    context, source, early_answer = await _route_context(user_question)
+    if early_answer is not None:
+        return _pipeline_result(early_answer, source=source, verdict="no_information")
+    return await _generate_answer(user_question, context, source)
+
+async def _generate_answer(user_question: str, context: str, source: str) -> dict:
+    if PIPELINE_MODE == "self_graded":
+        return await _generate_self_graded_answer(user_question, context, source)
+
+    # 4. SOLUTION GENERATION
+    with stage("generation"):
+        solution = await gemini_call(_build_solution_prompt(user_question, source, context))
+    generation_failed = solution.startswith("Error:")
+    with stage("output_guardrails"):
+        solution, _ = _apply_output_guardrails(solution)
+
+    # 5. FEEDBACK EVALUATION
+    with stage("evaluation"):
+        evaluation = await _evaluate_solution(user_question, solution, source, context, generation_failed)
+    return await _resolve_evaluation(user_question, solution, source, evaluation, generation_failed)
+
+async def _generate_self_graded_answer(user_question: str, context: str, source: str) -> dict:
+    """Generate and self-evaluate in one structured Gemini call"""
+    with stage("generation", self_graded=True):
+        raw_output = await gemini_call(_build_self_graded_prompt(user_question, source, context),
+                                       generation_config=SELF_GRADED_GENERATION_CONFIG)
+    generation_failed = raw_output.startswith("Error:")
+    graded = None if generation_failed else _parse_self_graded(raw_output)
+    annotate('self_graded', graded is not None)
+
+    if graded is None:
+        # Unusable JSON: treat the output as a plain solution and evaluate it separately
+        if not generation_failed:
+            routing_stats['self_graded_parse_failures'] += 1
+        with stage("output_guardrails"):
+            solution, _ = _apply_output_guardrails(raw_output)
+        with stage("evaluation"):
+            evaluation = await _evaluate_solution(user_question, solution, source, context, generation_failed)
+        return await _resolve_evaluation(user_question, solution, source, evaluation, generation_failed)
+
+    routing_stats['self_graded_answers'] += 1
+    with stage("output_guardrails"):
+        solution, _ = _apply_output_guardrails(graded['solution'])
+    evaluation = format_evaluation(graded['accuracy'], graded['clarity'], graded['reason'])
+    return await _resolve_evaluation(user_question, solution, source, evaluation, generation_failed)
+
+async def _route_context(user_question: str, kb_result: Optional[tuple] = None) -> Tuple[str, str, Optional[str]]:
+    """Return (context, source, early_answer); early_answer ends the pipeline when set.
+
+    ``kb_result`` is a (question, answer) pair from an earlier batched KB
+    lookup; when given, the KB is not queried again.
+    """
     # 2. KNOWLEDGE BASE ROUTING
-    kb_question, kb_answer = math_kb.search(user_question)
-    context = ""
-    source = ""
+    route_start = time.perf_counter()
+    mcp_task = None
+    try:
+        if kb_result is not None:
+            kb_question, kb_answer = kb_result
+            kb_elapsed = 0.0
+        else:
+            if SPECULATIVE_MCP:
+                mcp_task = asyncio.create_task(mcp_tool._arun(user_question))
+                routing_stats['speculative_started'] += 1
 
-    if kb_answer:
-        context = f"""
+            with stage("kb_search"):
+                kb_question, kb_answer = await asyncio.to_thread(math_kb.search, user_question)
+            kb_elapsed = time.perf_counter() - route_start
+            routing_stats['kb_seconds_total'] += kb_elapsed
+
+        annotate('kb_hit', bool(kb_answer))
+        if kb_answer:
+            annotate('kb_similarity', kb_answer['similarity_score'])
+            routing_stats['kb_hits'] += 1
+            if mcp_task is not None:
+                routing_stats['speculation_wasted'] += 1
+                if not mcp_task.done():
+                    routing_stats['speculation_cancelled_in_flight'] += 1
+            context = f"""
         The answer was found in the knowledge base.
         QUESTION IN KB: {kb_question}
         ANSWER IN KB: {kb_answer['answer']}
         Please use this information to create a step-by-step solution.
         """
-        source = "Knowledge Base"
-    else:
+            return context, "Knowledge Base", None
+
         # 3. MCP WEB SEARCH ROUTING
         print("🔍 Answer not in Knowledge Base. Searching via MCP...")
+        routing_stats['mcp_searches'] += 1
         try:
-            web_context = await mcp_tool._arun(user_question)  # Use async version
-            
+            if mcp_task is not None:
+                # The search has been running while the KB was queried
+                routing_stats['speculation_used'] += 1
+                routing_stats['speculation_overlap_seconds_total'] += kb_elapsed
+                mcp_start = route_start
+                with stage("mcp_search", speculative=True):
+                    web_context = await mcp_task
+            else:
+                mcp_start = time.perf_counter()
+                with stage("mcp_search", speculative=False):
+                    web_context = await mcp_tool._arun(user_question)  # Use async version
+            routing_stats['mcp_seconds_total'] += time.perf_counter() - mcp_start
+        
             # Check if MCP search failed or found nothing useful
             if "MCP search encountered an issue" in web_context:
                 print("⚠️ MCP server not available.")
                 context = f"The answer was not in our knowledge base. MCP search result: {web_context}"
-                source = "MCP Web Search (Failed)"
+                return context, "MCP Web Search (Failed)", None
             elif contains_uncertainty(web_context):
-                return "I don't have enough information to answer this question accurately. The topic may be too specialized or I need more context."
+                return "", "Web Search (via MCP)", NO_INFORMATION_ANSWER
             else:
                 context = f"The answer was not in our knowledge base. Web search context: {web_context}"
-                source = "Web Search (via MCP)"
-                
+                return context, "Web Search (via MCP)", None
+            
         except Exception as e:
             # Handle any unexpected errors during MCP search
             print(f"⚠️ Unexpected error during MCP search: {e}")
             context = f"The answer was not in our knowledge base. MCP search encountered an unexpected error: {str(e)}"
-            source = "MCP Web Search (Error)"
+            return context, "MCP Web Search (Error)", None
+    finally:
+        # A speculative search whose result was not awaited (KB hit, KB error, cancelled
+        # request) must not outlive the request
+        if mcp_task is not None and not mcp_task.done():
+            mcp_task.cancel()
 
-    # 4. SOLUTION GENERATION
-    solution_prompt = f"""Create a step-by-step solution. If information is incomplete, be honest about limitations.
+def _build_solution_prompt(user_question: str, source: str, context: str) -> str:
+    return f"""Create a step-by-step solution. If information is incomplete, be honest about limitations.
     STUDENT'S QUESTION: {user_question}
     SOURCE: {source}
     CONTEXT: {context}
@@ -124,18 +484,9 @@ async def math_agent_query(user_question: str) -> str:
     IMPORTANT: Provide a clear, step-by-step mathematical solution.
     Your solution must be accurate, educational, and honest about knowledge limits.
     """
-    
-    solution = gemini_call(solution_prompt)
-    
-    # Apply output guardrails
-    is_valid, validation_msg = output_guardrails.validate_educational_content(solution)
-    if not is_valid:
-        solution = f"Note: {validation_msg}\n\nProceeding with caution:\n{solution}"
-    
-    solution = output_guardrails.sanitize_output(solution)
 
-    # 5. FEEDBACK EVALUATION
-    evaluation_prompt = f"""Evaluate this solution for the question: '{user_question}'.
+def _build_evaluation_prompt(user_question: str, solution: str) -> str:
+    return f"""Evaluate this solution for the question: '{user_question}'.
     Score it from 1-10 on Accuracy and 1-10 on Clarity.
     If both scores are 8 or above, respond with "APPROVED: [solution]".
     If any score is below 8, respond with exactly this phrase:
@@ -143,21 +494,103 @@ async def math_agent_query(user_question: str) -> str:
     
     SOLUTION TO EVALUATE: {solution}
     """
+
+async def _evaluate_solution(user_question: str, solution: str, source: str,
+                             context: str, generation_failed: bool) -> str:
+    """Score the solution locally or with Gemini, depending on EVALUATOR_MODE"""
+    return await evaluation_router.evaluate(
+        user_question, solution, source, context,
+        llm_evaluate=lambda: gemini_call(_build_evaluation_prompt(user_question, solution)),
+        generation_failed=generation_failed
+    )
+
+def _build_self_graded_prompt(user_question: str, source: str, context: str) -> str:
+    return f"""Create a step-by-step solution, then grade it honestly. If information is incomplete, be honest about limitations.
+    STUDENT'S QUESTION: {user_question}
+    SOURCE: {source}
+    CONTEXT: {context}
     
-    evaluation = gemini_call(evaluation_prompt)
+    Respond with a JSON object with exactly these keys:
+    "solution": the clear, step-by-step mathematical solution,
+    "accuracy_score": integer 1-10 for the accuracy of the solution,
+    "clarity_score": integer 1-10 for the clarity of the solution,
+    "reason": one sentence explaining the scores.
+    Score strictly: use scores below 8 whenever you are unsure the solution is correct and complete.
+    """
+
+def _parse_self_graded(raw_output: str) -> Optional[dict]:
+    """Return solution, accuracy, clarity and reason from a self-graded reply, or None if malformed"""
+    try:
+        data = json.loads(raw_output)
+        solution = data['solution']
+        accuracy = int(data['accuracy_score'])
+        clarity = int(data['clarity_score'])
+    except (ValueError, TypeError, KeyError):
+        return None
+    if not isinstance(solution, str) or not solution.strip():
+        return None
+    return {
+        'solution': solution,
+        'accuracy': max(0, min(accuracy, 10)),
+        'clarity': max(0, min(clarity, 10)),
+        'reason': str(data.get('reason') or "No reason provided")
+    }
+
+def _apply_output_guardrails(solution: str) -> Tuple[str, Optional[str]]:
+    """Return the sanitized solution and the validation message if it failed validation"""
+    is_valid, validation_msg = output_guardrails.validate_educational_content(solution)
+    if not is_valid:
+        solution = f"Note: {validation_msg}\n\nProceeding with caution:\n{solution}"
+    
+    return output_guardrails.sanitize_output(solution), None if is_valid else validation_msg
 
+async def _resolve_evaluation(user_question: str, solution: str, source: str,
+                              evaluation: str, generation_failed: bool) -> dict:
     # 6. Check if feedback is needed AND human feedback is available
-    if "HUMAN_FEEDBACK_NEEDED" in evaluation and is_human_feedback_available():
+    if "HUMAN_FEEDBACK_NEEDED" in evaluation and is_human_feedback_available() and feedback_queue.running:
+        # Answer now with the provisional solution; the review finishes in the background
+        ticket = feedback_queue.submit(user_question, evaluation, solution, on_refined=_store_cached_answer)
+        annotate('feedback_ticket', ticket.id)
+        result = _pipeline_result(solution, source=source, verdict="feedback_pending")
+        result['feedback_ticket'] = ticket.id
+        return result
+    elif "HUMAN_FEEDBACK_NEEDED" in evaluation and is_human_feedback_available():
         print("\n--- Triggering Human-in-the-Loop ---")
-        refined_answer = get_human_feedback(user_question, evaluation)
-        return refined_answer
+        with stage("human_feedback"):
+            refined_answer = await get_human_feedback(user_question, evaluation)
+        return _pipeline_result(
+            refined_answer,
+            source="Human Feedback",
+            verdict="human_feedback",
+            cacheable=refined_answer.startswith(FEEDBACK_ENHANCED_HEADER)
+        )
     elif "HUMAN_FEEDBACK_NEEDED" in evaluation:
         print("\n--- Human Feedback Needed but Not Available ---")
-        return "I need human review for this answer, but the feedback system is currently unavailable. Please try again later or ask a different question."
+        return _pipeline_result(REVIEW_UNAVAILABLE_ANSWER, source=source, verdict="review_unavailable")
     elif "APPROVED:" in evaluation:
-        return solution
+        return _pipeline_result(solution, source=source, verdict="approved", cacheable=not generation_failed)
     else:
-        return solution
+        return _pipeline_result(solution, source=source, verdict="unverified")
+
+def warm_up() -> dict:
+    """Initialize the knowledge base, embedding model and Gemini client ahead of traffic.
+
+    Everything is otherwise built lazily on first use; call this from a
+    server startup hook so the first request does not pay for it.
+    """
+    timings = {'knowledge_base_seconds': warm_up_knowledge_base()}
+    started = time.perf_counter()
+    llm_client.get_model()
+    timings['llm_client_seconds'] = time.perf_counter() - started
+    print(f"🔥 Warm-up complete: {timings}")
+    return timings
+
+def readiness() -> dict:
+    components = {
+        'knowledge_base': is_math_kb_ready(),
+        'llm_client': llm_client.is_ready
+    }
+    return {'ready': all(components.values()), 'components': components}
 
 # Test function (keep this sync for command line testing)
 def test_math_agent(query: str) -> str:
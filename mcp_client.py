@@ -1,75 +1,269 @@
 import aiohttp
 import asyncio
-from typing import List
+import os
+import time
+from typing import List, Optional, Tuple
 import json
+from response_cache import TTLCache
+from replay_store import replay_backend
+
+SEARCH_DOMAINS = ["khanacademy.org", "mathsisfun.com", "wolfram.com"]
+
+class CircuitBreaker:
+    """Fail fast after repeated errors instead of paying a timeout per request.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls are refused for ``cooldown_seconds``. Then one trial call is let
+    through (half-open): success closes the circuit, failure reopens it.
+    """
+
+    def __init__(self, failure_threshold: int = 3, cooldown_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+        self.times_opened = 0
+        self.rejected_calls = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown_seconds:
+            return "half_open"
+        return "open"
+
+    def allow_request(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        self.rejected_calls += 1
+        return False
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.trial_in_flight or self.consecutive_failures >= self.failure_threshold:
+            if self.opened_at is None or self.trial_in_flight:
+                self.times_opened += 1
+            self.opened_at = time.monotonic()
+        self.trial_in_flight = False
+
+    def release_trial(self):
+        """Forget an unfinished trial call (e.g. one that was cancelled)"""
+        self.trial_in_flight = False
+
+    def stats(self) -> dict:
+        return {
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'times_opened': self.times_opened,
+            'rejected_calls': self.rejected_calls
+        }
 
 class MCPClient:
-    def __init__(self):
-        self.base_url = "http://localhost:3000"
+    def __init__(self, base_url: str = None, pool_size: int = 20):
+        self.base_url = base_url or os.getenv("MCP_SERVER_URL", "http://localhost:3000")
+        self.pool_size = pool_size
         self.initialized = False
-        
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv("MCP_BREAKER_FAILURES", "3")),
+            cooldown_seconds=float(os.getenv("MCP_BREAKER_COOLDOWN", "30"))
+        )
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # Successful searches are reused for a while; empty or failed ones only briefly
+        self.result_cache = TTLCache(
+            max_size=int(os.getenv("MCP_CACHE_SIZE", "2000")),
+            ttl_seconds=float(os.getenv("MCP_CACHE_TTL", "21600"))
+        )
+        self.negative_cache = TTLCache(
+            max_size=int(os.getenv("MCP_CACHE_SIZE", "2000")),
+            ttl_seconds=float(os.getenv("MCP_NEGATIVE_CACHE_TTL", "60"))
+        )
+        self.cache_file = os.getenv("MCP_CACHE_FILE", "")
+        if self.cache_file:
+            self._load_cache()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Shared keep-alive session, recreated if the event loop changed"""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            )
+            self._session_loop = loop
+        return self._session
+
     async def initialize(self):
-        """Initialize MCP connection - simple version"""
+        """Check the MCP server once, e.g. at application startup"""
+        if replay_backend.replaying:
+            self.initialized = True
+            return
         try:
             # Test connection to MCP server
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.base_url}/health", timeout=5) as response:
-                    if response.status == 200:
-                        self.initialized = True
-                        print("✅ MCP Client connected successfully")
-                    else:
-                        print("⚠️ MCP Server not responding properly")
-                        self.initialized = False
+            session = await self._get_session()
+            async with session.get(f"{self.base_url}/health", timeout=5) as response:
+                if response.status == 200:
+                    self.initialized = True
+                    print("✅ MCP Client connected successfully")
+                else:
+                    print("⚠️ MCP Server not responding properly")
+                    self.initialized = False
         except Exception as e:
             print(f"❌ MCP Connection failed: {e}")
             self.initialized = False
 
+    @staticmethod
+    def _cache_key(query: str, max_results: int, include_domains: List[str]) -> str:
+        return json.dumps([query, max_results, sorted(include_domains)])
+
     async def search(self, query: str, max_results: int = 3) -> List[str]:
-        """Perform search using MCP protocol - simplified version"""
-        if not self.initialized:
-            await self.initialize()
-            
+        """Perform search using MCP protocol, answering repeats from the result caches"""
+        cache_key = self._cache_key(query, max_results, SEARCH_DOMAINS)
+        cached = self.result_cache.get(cache_key)
+        if cached is None:
+            cached = self.negative_cache.get(cache_key)
+        if cached is not None:
+            return list(cached)
+
+        if not self.breaker.allow_request():
+            return ["MCP search unavailable: skipped while the server is failing (circuit open)"]
+
+        results, found = await self._search_remote(query, max_results, SEARCH_DOMAINS)
+        if found:
+            self.result_cache.set(cache_key, results)
+        else:
+            self.negative_cache.set(cache_key, results)
+        return results
+
+    async def _search_remote(self, query: str, max_results: int,
+                             include_domains: List[str]) -> Tuple[List[str], bool]:
+        """Call the MCP server (or the replay store); returns (results, whether anything useful was found)"""
+        request = {'query': query, 'max_results': max_results, 'include_domains': include_domains}
+        if replay_backend.replaying:
+            await replay_backend.mcp_latency.wait()
+            results, found = replay_backend.store.get("mcp", request)
+            return results, found
+
+        results, found = await self._post_search(query, max_results, include_domains)
+        if replay_backend.recording:
+            await replay_backend.store.put("mcp", request, [results, found])
+        return results, found
+
+    async def _post_search(self, query: str, max_results: int,
+                           include_domains: List[str]) -> Tuple[List[str], bool]:
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f'{self.base_url}/call',
-                    json={
-                        "function": "search",
-                        "arguments": {
-                            "query": f"mathematics {query}",
-                            "max_results": max_results,
-                            "include_domains": ["khanacademy.org", "mathsisfun.com", "wolfram.com"]
-                        }
-                    },
-                    timeout=10
-                ) as response:
-                    
-                    if response.status == 200:
-                        result = await response.json()
-                        if result and 'content' in result:
-                            formatted_results = []
-                            for item in result['content']:
-                                if isinstance(item, dict):
-                                    title = item.get('title', 'No title')
-                                    content = item.get('content', 'No content')
-                                    formatted_results.append(f"{title}: {content[:150]}...")
-                                else:
-                                    formatted_results.append(f"{item}")
-                            
-                            return formatted_results
-                    
-                    return [f"No relevant web results found for '{query}'"]
-                    
+            session = await self._get_session()
+            async with session.post(
+                f'{self.base_url}/call',
+                json={
+                    "function": "search",
+                    "arguments": {
+                        "query": f"mathematics {query}",
+                        "max_results": max_results,
+                        "include_domains": include_domains
+                    }
+                },
+                timeout=10
+            ) as response:
+
+                if response.status >= 500:
+                    self.breaker.record_failure()
+                    return [f"No relevant web results found for '{query}'"], False
+
+                self.breaker.record_success()
+                self.initialized = True
+                if response.status == 200:
+                    result = await response.json()
+                    if result and 'content' in result:
+                        formatted_results = []
+                        for item in result['content']:
+                            if isinstance(item, dict):
+                                title = item.get('title', 'No title')
+                                content = item.get('content', 'No content')
+                                formatted_results.append(f"{title}: {content[:150]}...")
+                            else:
+                                formatted_results.append(f"{item}")
+
+                        return formatted_results, bool(formatted_results)
+
+                return [f"No relevant web results found for '{query}'"], False
+
+        except asyncio.CancelledError:
+            self.breaker.release_trial()
+            raise
         except aiohttp.ClientError as e:
-            return [f"MCP connection failed: {str(e)}"]
+            self.breaker.record_failure()
+            return [f"MCP connection failed: {str(e)}"], False
         except asyncio.TimeoutError:
-            return ["MCP search timeout: Server took too long to respond"]
+            self.breaker.record_failure()
+            return ["MCP search timeout: Server took too long to respond"], False
         except Exception as e:
-            return [f"MCP search error: {str(e)}"]
+            self.breaker.record_failure()
+            return [f"MCP search error: {str(e)}"], False
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_file, 'r') as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring unreadable MCP cache file {self.cache_file}: {e}")
+            return
+
+        # Remaining TTLs were recorded at save time; charge the downtime against them
+        elapsed = max(0.0, time.time() - saved.get('saved_at', 0))
+        self.result_cache.load_entries(
+            (key, remaining - elapsed, value) for key, remaining, value in saved.get('results', [])
+        )
+        self.negative_cache.load_entries(
+            (key, remaining - elapsed, value) for key, remaining, value in saved.get('negative', [])
+        )
+        print(f"✅ Loaded {len(self.result_cache)} cached MCP searches from {self.cache_file}")
+
+    def save_cache(self):
+        """Write the result caches to MCP_CACHE_FILE so a restart keeps them"""
+        if not self.cache_file:
+            return
+        payload = {
+            'saved_at': time.time(),
+            'results': self.result_cache.export_entries(),
+            'negative': self.negative_cache.export_entries()
+        }
+        temp_file = f"{self.cache_file}.tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(payload, f)
+        os.replace(temp_file, self.cache_file)
+
+    def stats(self) -> dict:
+        return {
+            'initialized': self.initialized,
+            'circuit_breaker': self.breaker.stats(),
+            'result_cache': self.result_cache.stats(),
+            'negative_cache': self.negative_cache.stats()
+        }
 
     async def close(self):
         """Cleanup MCP connection"""
-        pass
+        try:
+            self.save_cache()
+        except OSError as e:
+            print(f"⚠️ Could not save MCP cache: {e}")
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._session_loop = None
 
 # Global MCP client instance
-mcp_client_instance = MCPClient()
\ No newline at end of file
+mcp_client_instance = MCPClient()
@@ -0,0 +1,157 @@
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# (metric name, label dict, value)
+Sample = Tuple[str, Dict[str, str], float]
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIMILARITY_BUCKETS = (0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 1.0)
+
+def nearest_rank(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of raw samples (benchmarks); 0.0 for an empty list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(pct / 100 * len(ordered))) - 1]
+
+def _label_key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted(labels.items()))
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for key, value in sorted(labels.items()):
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self.kind = "counter"
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [(self.name, dict(key), value) for key, value in self._values.items()]
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.kind = "histogram"
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            # Per-bucket counts, then running count and sum
+            series = self._series.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def samples(self) -> List[Sample]:
+        samples = []
+        with self._lock:
+            for key, series in self._series.items():
+                labels = dict(key)
+                for bound, count in zip(self.buckets, series):
+                    samples.append((f"{self.name}_bucket", {**labels, 'le': repr(bound)}, count))
+                samples.append((f"{self.name}_bucket", {**labels, 'le': '+Inf'}, series[-2]))
+                samples.append((f"{self.name}_count", labels, series[-2]))
+                samples.append((f"{self.name}_sum", labels, series[-1]))
+        return samples
+
+class MetricsRegistry:
+    """Metrics owned here plus gauges read from existing stats on each scrape"""
+
+    def __init__(self):
+        self._metrics: List = []
+        self._collectors: List[Tuple[str, str, Callable[[], List[Sample]]]] = []
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        metric = Counter(name, help_text)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_gauges(self, name: str, help_text: str, collect: Callable[[], List[Sample]]):
+        """``collect`` returns (name, labels, value) samples; all samples share the metric name"""
+        self._collectors.append((name, help_text, collect))
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        for name, help_text, collect in self._collectors:
+            try:
+                samples = collect()
+            except Exception as e:
+                print(f"⚠️ Metrics collector {name} failed: {e}")
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for sample_name, labels, value in samples:
+                lines.append(f"{sample_name}{_format_labels(labels)} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+REQUESTS = registry.counter("math_agent_requests_total", "Answered questions by routing source and verdict")
+REQUEST_SECONDS = registry.histogram("math_agent_request_seconds", "End-to-end pipeline latency")
+STAGE_SECONDS = registry.histogram("math_agent_stage_seconds", "Latency of each pipeline stage")
+KB_SIMILARITY = registry.histogram("math_agent_kb_similarity", "Similarity score of KB hits", SIMILARITY_BUCKETS)
+CACHE_LOOKUPS = registry.counter("math_agent_cache_lookups_total", "Answer cache lookups by outcome")
+KB_ROUTING = registry.counter("math_agent_kb_routing_total", "KB lookups by hit or miss")
+FEEDBACK_WAIT_SECONDS = registry.histogram("math_agent_feedback_wait_seconds", "Time feedback jobs spent queued")
+FEEDBACK_JOB_SECONDS = registry.histogram("math_agent_feedback_job_seconds", "Time spent processing a feedback job")
+LLM_QUEUE_WAIT_SECONDS = registry.histogram("math_agent_llm_queue_wait_seconds", "Time LLM calls waited for the scheduler, by priority")
+
+def record_trace(trace: Dict):
+    """Fold a finished PipelineTrace.to_dict() into the metrics"""
+    REQUESTS.inc(source=trace.get('source', 'unknown'), verdict=trace.get('verdict', 'unknown'))
+    REQUEST_SECONDS.observe(trace['total_seconds'])
+    for span in trace['spans']:
+        STAGE_SECONDS.observe(span['seconds'], stage=span['name'])
+    if 'cache' in trace:
+        CACHE_LOOKUPS.inc(result=trace['cache'])
+    if 'kb_hit' in trace:
+        KB_ROUTING.inc(result="hit" if trace['kb_hit'] else "miss")
+    if trace.get('kb_similarity') is not None:
+        KB_SIMILARITY.observe(trace['kb_similarity'])
+
+def stats_samples(name: str, stats: Dict, labels: Optional[Dict[str, str]] = None) -> List[Sample]:
+    """Turn the numeric fields of a stats() dict into gauge samples labelled by field"""
+    return [
+        (name, {**(labels or {}), 'field': key}, float(value))
+        for key, value in stats.items()
+        if isinstance(value, (int, float))
+    ]
+
+def server_timing_header(trace: Dict) -> str:
+    """Per-stage durations in the Server-Timing header format (milliseconds)"""
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in trace['stages'].items()]
+    entries.append(f"total;dur={trace['total_seconds'] * 1000:.1f}")
+    return ", ".join(entries)
@@ -1,57 +1,65 @@
 import re
 import math
 from typing import Tuple
+from guardrail_engine import GuardrailEngine, guardrail_engine
 
 class OutputGuardrails:
-    def __init__(self):
-        self.math_keywords = [
-            'step', 'solution', 'calculate', 'formula', 'equation',
-            'theorem', 'proof', 'derivative', 'integral', 'solve',
-            'therefore', 'thus', 'hence', 'result', 'answer'
-        ]
-        
-        self.inappropriate_patterns = [
-            r'\b(cannot|can\'t|don\'t know|unsure|guess|maybe|perhaps)\b',
-            r'\b(illegal|dangerous|harmful|violent|inappropriate)\b',
-            r'\b(\$\$|money|cash|price|cost|buy|sell)\b'
-        ]
+    def __init__(self, engine: GuardrailEngine = guardrail_engine):
+        # Keyword lists and patterns are compiled once in the shared engine
+        self.engine = engine
+        self.math_keywords = list(engine.solution_keywords.keywords)
+        self.inappropriate_patterns = list(engine.inappropriate_patterns)
 
     def validate_educational_content(self, response: str) -> Tuple[bool, str]:
         """Validate response meets educational standards"""
-        
-        # Check for step-by-step structure
-        step_count = len(re.findall(r'(Step \d+|step \d+|•|\d+\.)', response))
-        if step_count < 2:
-            return False, "Response should provide step-by-step solution"
-        
-        # Check for mathematical content
-        math_content = any(keyword in response.lower() for keyword in self.math_keywords)
-        if not math_content:
-            return False, "Response should contain mathematical explanations"
-        
-        # Check for inappropriate content
-        for pattern in self.inappropriate_patterns:
-            if re.search(pattern, response, re.IGNORECASE):
-                return False, "Response contains inappropriate content"
-        
-        # Check length (not too short)
-        if len(response.split()) < 20:
-            return False, "Response should be sufficiently detailed"
-        
-        return True, "Valid educational response"
+        return self.engine.validate_educational_content(response)
+
+    def redact(self, response: str) -> str:
+        """Replace potentially harmful content with [REDACTED]"""
+        return self.engine.redact(response)
 
     def sanitize_output(self, response: str) -> str:
         """Sanitize and format the output for educational purposes"""
-        
-        # Remove any potentially harmful content
-        for pattern in self.inappropriate_patterns:
-            response = re.sub(pattern, '[REDACTED]', response, flags=re.IGNORECASE)
-        
-        # Ensure proper formatting
-        response = re.sub(r'\n{3,}', '\n\n', response)  # Remove extra newlines
-        response = response.strip()
-        
-        return response
+        return self.engine.sanitize(response)
+
+    def streaming_sanitizer(self) -> "StreamingSanitizer":
+        return StreamingSanitizer(self)
+
+class StreamingSanitizer:
+    """Apply sanitize_output incrementally to streamed text.
+
+    The last two words of the stream are held back, because an inappropriate
+    pattern (e.g. "don't know") may still be completed by the next chunk; a
+    match straddling that point is held back as a whole. Everything emitted
+    is final, and the emitted pieces join up to sanitize_output() of the
+    full text.
+    """
+
+    _HOLDBACK = re.compile(r'(\S+\s+)?\S*\s*\Z')
+
+    def __init__(self, guardrails: OutputGuardrails):
+        self.guardrails = guardrails
+        self._pending = ""
+        self._started = False
+
+    def feed(self, chunk: str) -> str:
+        self._pending += chunk
+        cut = self._HOLDBACK.search(self._pending).start()
+        cut = self.guardrails.engine.straddling_match_start(self._pending, cut)
+
+        ready, self._pending = self._pending[:cut], self._pending[cut:]
+        return self._format(self.guardrails.redact(ready))
+
+    def flush(self) -> str:
+        ready, self._pending = self._pending, ""
+        return self._format(self.guardrails.redact(ready)).rstrip()
+
+    def _format(self, text: str) -> str:
+        text = self.guardrails.engine.collapse_newlines(text)
+        if not self._started:
+            text = text.lstrip()
+            self._started = bool(text)
+        return text
 
 # Global instance
 output_guardrails = OutputGuardrails()
\ No newline at end of file
@@ -0,0 +1,86 @@
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Weighted patterns per topic; a question's score for a topic is the sum of the weights that match
+CATEGORY_PATTERNS: Dict[str, List[Tuple[str, float]]] = {
+    'calculus': [
+        (r'\bderivative|\bdifferentiat|\bd/dx\b|\bdy/dx\b', 3.0),
+        (r'\bintegra(l|te|tion)|∫', 3.0),
+        (r'\blim(it)?s?\b|→\s*0|->\s*0', 2.0),
+        (r"\bl'?h[oô]pital|\btaylor\b|\bmaclaurin\b|\bseries\b", 2.0),
+        (r'\b(maxima|minima|maximi[sz]e|minimi[sz]e|rate of change|concav)', 1.5),
+    ],
+    'algebra': [
+        (r'\bquadratic|\bpolynomial|\broots?\b|\bfactori[sz]', 3.0),
+        (r'\bsolve\b|\bequation|\binequalit', 1.5),
+        (r'\blogarithm|\blog\b|\bexponent', 1.5),
+        (r'\bsequence|\bprogression|\bbinomial', 1.5),
+        (r'\b[a-z]\s*[²³^]|[0-9]\s*[a-z]\s*[+\-=]', 1.0),
+    ],
+    'geometry': [
+        (r'\btriangle|\bcircle|\bpolygon|\bsquare\b|\brectangle|\bsphere|\bcone\b|\bcylinder', 3.0),
+        (r'\bpythagor|\bhypotenuse|\bangle|\bradius|\bdiameter|\bchord|\btangent to', 2.5),
+        (r'\barea\b|\bperimeter|\bvolume|\bcircumference', 2.0),
+        (r'\bcoordinate|\bellipse|\bparabola|\bhyperbola|\bslope', 1.5),
+    ],
+    'trigonometry': [
+        (r'\b(sin|cos|tan|sec|cosec|csc|cot)\s*\(?\s*[a-zθ0-9]', 2.0),
+        (r'\btrigonometr|\bidentity|\bidentities', 2.5),
+    ],
+    'probability': [
+        (r'\bprobabilit|\brandom(ly)?\b|\bexpected value|\bdice\b|\bcoins?\b|\bcards?\b', 3.0),
+        (r'\bstatistic|\bmean\b|\bmedian\b|\bvariance|\bstandard deviation|\bdistribution', 2.0),
+        (r'\bpermutation|\bcombination|\bchoose\b|\bnCr\b', 2.0),
+    ],
+}
+
+# Categories that mix topics (competition sets, uncategorized items); always searched
+MIXED_CATEGORIES = ("general", "jee_advanced", "imo")
+
+class QueryClassifier:
+    """Keyword/regex topic classifier used to pre-filter knowledge base searches.
+
+    ``classify`` returns the best topic and a confidence (its share of the
+    total score). Below ``min_confidence`` or ``min_score`` no topic is
+    predicted and searches stay unfiltered.
+    """
+
+    def __init__(self, patterns: Dict[str, List[Tuple[str, float]]] = CATEGORY_PATTERNS,
+                 min_confidence: float = 0.6, min_score: float = 2.0):
+        self.min_confidence = min_confidence
+        self.min_score = min_score
+        self._patterns = {
+            category: [(re.compile(pattern, re.IGNORECASE), weight) for pattern, weight in rules]
+            for category, rules in patterns.items()
+        }
+
+    def scores(self, text: str) -> Dict[str, float]:
+        return {
+            category: sum(weight for pattern, weight in rules if pattern.search(text))
+            for category, rules in self._patterns.items()
+        }
+
+    def classify(self, text: str) -> Tuple[Optional[str], float]:
+        """(category, confidence); category is None when the prediction is not confident enough"""
+        scores = self.scores(text)
+        total = sum(scores.values())
+        if not total:
+            return None, 0.0
+        category, best = max(scores.items(), key=lambda item: item[1])
+        confidence = best / total
+        if best < self.min_score or confidence < self.min_confidence:
+            return None, confidence
+        return category, confidence
+
+    def where_filter(self, text: str) -> Optional[dict]:
+        """Chroma ``where`` clause for the predicted topic, or None for an unfiltered search"""
+        category, _ = self.classify(text)
+        if category is None:
+            return None
+        return {"category": {"$in": [category, *MIXED_CATEGORIES]}}
+
+# Global classifier
+query_classifier = QueryClassifier(
+    min_confidence=float(os.getenv("KB_CATEGORY_MIN_CONFIDENCE", "0.6"))
+)
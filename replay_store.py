@@ -0,0 +1,171 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+from typing import Any, Optional
+
+class ReplayMissError(LookupError):
+    """Raised in replay mode when no recording exists for a request"""
+
+class SyntheticLatency:
+    """Latency distribution for replayed responses.
+
+    Specs: ``"fixed:0.5"``, ``"uniform:0.2,1.5"``, ``"lognormal:0.0,0.5"``
+    (mu and sigma of the underlying normal, in log-seconds), or ``""`` for
+    no added latency. A fixed seed keeps runs repeatable.
+    """
+
+    def __init__(self, spec: str = "", seed: int = 0):
+        self.spec = spec
+        self._random = random.Random(seed)
+        kind, _, params = spec.partition(":")
+        self.kind = kind.strip().lower()
+        self.params = [float(p) for p in params.split(",") if p.strip()]
+        if self.kind not in ("", "fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sample(self) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return self._random.uniform(self.params[0], self.params[1])
+        if self.kind == "lognormal":
+            return self._random.lognormvariate(self.params[0], self.params[1])
+        return 0.0
+
+    async def wait(self):
+        delay = self.sample()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class ReplayStore:
+    """Request -> response recordings keyed by a hash of the request.
+
+    Recordings are appended to a JSONL file, one ``{"key", "request",
+    "response"}`` object per line, so a record run writes each response
+    once; a later line for the same key wins. Files in the older single
+    JSON object layout still load and are converted on the first write.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._legacy = False
+        self._entries = self._load()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, 'r') as f:
+                text = f.read()
+        except FileNotFoundError:
+            return {}
+        try:
+            data = json.loads(text)
+        except ValueError:
+            data = None
+        if isinstance(data, dict) and 'key' not in data:
+            self._legacy = True
+            return data
+
+        entries = {}
+        for number, line in enumerate(text.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                entries[record['key']] = {'request': record['request'], 'response': record['response']}
+            except (ValueError, KeyError, TypeError):
+                # e.g. the last line of a run that was killed mid-write
+                print(f"⚠️ Skipping unreadable recording on line {number} of {self.path}")
+        return entries
+
+    @staticmethod
+    def key(kind: str, request: Any) -> str:
+        payload = json.dumps([kind, request], sort_keys=True, ensure_ascii=False)
+        return f"{kind}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+    def get(self, kind: str, request: Any) -> Any:
+        entry = self._entries.get(self.key(kind, request))
+        if entry is None:
+            self.misses += 1
+            raise ReplayMissError(f"No {kind} recording for this request in {self.path}")
+        self.hits += 1
+        return entry['response']
+
+    async def put(self, kind: str, request: Any, response: Any):
+        """Record a response; the line is appended off the event loop"""
+        key = self.key(kind, request)
+        self._entries[key] = {'request': request, 'response': response}
+        line = json.dumps({'key': key, 'request': request, 'response': response}, ensure_ascii=False)
+        await asyncio.to_thread(self._append, line)
+
+    def _append(self, line: str):
+        with self._lock:
+            if self._legacy:
+                self._rewrite()  # includes this entry
+                return
+            with open(self.path, 'a') as f:
+                f.write(line + "\n")
+
+    def _rewrite(self):
+        """Convert an old single-object file to JSONL (once)"""
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as f:
+            for key, entry in list(self._entries.items()):
+                f.write(json.dumps({'key': key, **entry}, ensure_ascii=False) + "\n")
+        os.replace(temp_path, self.path)
+        self._legacy = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class ReplayBackend:
+    """Record/replay switch shared by the Gemini client and the MCP client.
+
+    REPLAY_MODE=record calls the live services and stores every response;
+    REPLAY_MODE=replay serves stored responses only (no network), delayed by
+    REPLAY_LLM_LATENCY / REPLAY_MCP_LATENCY. Any other value means live.
+    """
+
+    def __init__(self, mode: str = "", path: str = "replay_store.jsonl",
+                 llm_latency: str = "", mcp_latency: str = "", seed: int = 0):
+        self.mode = mode.strip().lower() if mode else "live"
+        self.path = path
+        self.llm_latency = SyntheticLatency(llm_latency, seed)
+        self.mcp_latency = SyntheticLatency(mcp_latency, seed + 1)
+        self._store: Optional[ReplayStore] = None
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    @property
+    def store(self) -> ReplayStore:
+        if self._store is None:
+            self._store = ReplayStore(self.path)
+        return self._store
+
+    def stats(self) -> dict:
+        return {
+            'mode': self.mode,
+            'recordings': len(self.store) if self.mode in ("record", "replay") else 0,
+            'replay_hits': self._store.hits if self._store else 0,
+            'replay_misses': self._store.misses if self._store else 0
+        }
+
+# Global record/replay backend
+replay_backend = ReplayBackend(
+    mode=os.getenv("REPLAY_MODE", "live"),
+    path=os.getenv("REPLAY_FILE", "replay_store.jsonl"),
+    llm_latency=os.getenv("REPLAY_LLM_LATENCY", ""),
+    mcp_latency=os.getenv("REPLAY_MCP_LATENCY", ""),
+    seed=int(os.getenv("REPLAY_SEED", "0"))
+)
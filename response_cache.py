@@ -0,0 +1,137 @@
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Unicode math symbols mapped to the ASCII spelling students usually type
+MATH_SYMBOL_MAP = {
+    '²': '^2', '³': '^3', '⁴': '^4', '¹': '^1', '⁰': '^0',
+    '√': 'sqrt', '∫': 'integral', '∑': 'sum', '∞': 'infinity',
+    'π': 'pi', 'θ': 'theta', 'α': 'alpha', 'β': 'beta', 'γ': 'gamma', 'Δ': 'delta',
+    '×': '*', '·': '*', '÷': '/', '−': '-', '–': '-', '±': '+-',
+    '≤': '<=', '≥': '>=', '≠': '!=', '≈': '~', '→': '->',
+    '‘': "'", '’': "'", '“': '"', '”': '"',
+}
+
+_SYMBOL_PATTERN = re.compile('|'.join(re.escape(symbol) for symbol in MATH_SYMBOL_MAP))
+# Sentence punctuation carries no meaning for the question; decimal points, factorials
+# ("5!", "n!", "(n+1)!"), "!=" and primes ("f'(x)", "f''(x)", "y' = 2x") do
+_PUNCTUATION_PATTERN = re.compile(
+    r"[?,;:\"`]|\.(?!\d)|(?<![\d)])(?<!\b[a-z])!(?!=)|(?<![\w'])'|'(?!'*\(|'*\s*=)"
+)
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+def normalize_question(question: str) -> str:
+    """Normalize a question so trivially different spellings share a cache key"""
+    # Map symbols first: NFKC would fold superscripts like ² into plain digits
+    text = _SYMBOL_PATTERN.sub(lambda match: MATH_SYMBOL_MAP[match.group(0)], question or '')
+    text = unicodedata.normalize('NFKC', text)
+    text = text.lower()
+    text = _PUNCTUATION_PATTERN.sub(' ', text)
+    text = _WHITESPACE_PATTERN.sub(' ', text)
+    return text.strip()
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after a TTL"""
+
+    def __init__(self, max_size: int = 1000, ttl_seconds: float = 3600.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: str) -> bool:
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+                return True
+            return False
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def export_entries(self) -> List[Tuple[str, float, Any]]:
+        """Live entries as (key, remaining_ttl_seconds, value), least recently used first"""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                (key, expires_at - now, value)
+                for key, (expires_at, value) in self._entries.items()
+                if expires_at > now
+            ]
+
+    def load_entries(self, entries: List[Tuple[str, float, Any]]):
+        for key, remaining_ttl, value in entries:
+            if remaining_ttl > 0:
+                self.set(key, value, ttl_seconds=remaining_ttl)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'ttl_seconds': self.ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations
+        }
+
+class ResponseCache(TTLCache):
+    """Exact-match answer cache keyed on the normalized question"""
+
+    def get_answer(self, question: str) -> Optional[str]:
+        return self.get(normalize_question(question))
+
+    def store_answer(self, question: str, answer: str):
+        self.set(normalize_question(question), answer)
+
+    def invalidate_question(self, question: str) -> bool:
+        return self.invalidate(normalize_question(question))
+
+# Global response cache instance
+response_cache = ResponseCache(
+    max_size=int(os.getenv("RESPONSE_CACHE_SIZE", "1000")),
+    ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+)
@@ -0,0 +1,181 @@
+import hashlib
+import os
+import re
+import statistics
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, Optional
+
+from response_cache import normalize_question
+
+# Math content must agree exactly, in order: "derivative of sin x" and "derivative of
+# cos x", or "solve 2x + 5 = 15" and "solve 5x + 2 = 15", embed almost identically but
+# have different answers. Tokens are numbers, function names, differentials ("dy/dx"),
+# single-letter variables with their primes and operators. "a" or "i" before a word is
+# English, and a hyphen between two words ("step-by-step") is not a minus sign
+_MATH_TOKEN_PATTERN = re.compile(
+    r"\d+(?:\.\d+)?"
+    r"|\b(?:sin|cos|tan|cot|sec|csc|log|ln|exp|sqrt|pi)\b"
+    r"|\bd[a-z]\b(?=\s*(?:[-+*/=)]|$))"
+    r"|(?<![a-z])(?![ai]\s+[a-z]{2})[a-z]'*(?![a-z])"
+    r"|<=|>=|!=|->|\+-|[+*/^=<>!()|]"
+    r"|(?<![a-z]{2})-|-(?![a-z]{2})"
+)
+_DISTANCE_BUCKETS = [0.05, 0.1, 0.15, 0.2, 0.3, 0.5, 1.0]
+
+def math_signature(question: str) -> str:
+    """Numbers, variables, operators and function names of the question, in order"""
+    return ' '.join(_MATH_TOKEN_PATTERN.findall(normalize_question(question)))
+
+class SemanticCache:
+    """Cache of final approved solutions matched by embedding distance.
+
+    Entries live in their own Chroma collection next to the knowledge base
+    and use the same embedding function, so paraphrases of a question that
+    was already answered skip the whole generation pipeline.
+    """
+
+    def __init__(self, collection_name: str = "semantic_response_cache",
+                 max_entries: int = 5000, distance_threshold: float = 0.15):
+        self.collection_name = collection_name
+        self.max_entries = max_entries
+        self.distance_threshold = distance_threshold
+        self._collection = None
+        self._lru: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.signature_rejections = 0
+        self._recent_distances = deque(maxlen=1000)
+
+    def _get_collection(self):
+        if self._collection is None:
+            from knowledge_base import math_kb
+
+            self._collection = math_kb.client.get_or_create_collection(
+                name=self.collection_name,
+                embedding_function=math_kb.embedding_function,
+                metadata={"hnsw:space": "cosine"}
+            )
+            existing = self._collection.get(include=["metadatas"])
+            ordered = sorted(
+                zip(existing['ids'], existing['metadatas']),
+                key=lambda item: item[1].get('last_used', 0)
+            )
+            self._lru = OrderedDict((entry_id, None) for entry_id, _ in ordered)
+        return self._collection
+
+    @staticmethod
+    def _entry_id(question: str) -> str:
+        return "semcache_" + hashlib.sha256(normalize_question(question).encode("utf-8")).hexdigest()[:16]
+
+    def lookup(self, question: str) -> Optional[str]:
+        """Return a cached solution for a question close enough to this one"""
+        with self._lock:
+            collection = self._get_collection()
+            if not self._lru:
+                self.misses += 1
+                return None
+
+            results = collection.query(
+                query_texts=[question],
+                n_results=min(3, len(self._lru)),
+                include=["metadatas", "distances"]
+            )
+            ids, metadatas, distances = results['ids'][0], results['metadatas'][0], results['distances'][0]
+            if distances:
+                self._recent_distances.append(distances[0])
+
+            signature = math_signature(question)
+            for entry_id, metadata, distance in zip(ids, metadatas, distances):
+                if distance > self.distance_threshold:
+                    break
+                if metadata.get('signature', '') != signature:
+                    self.signature_rejections += 1
+                    continue
+                self._lru.move_to_end(entry_id)
+                self.hits += 1
+                return metadata['answer']
+
+            self.misses += 1
+            return None
+
+    def store(self, question: str, answer: str):
+        """Cache a final approved solution, evicting the least recently used entries"""
+        with self._lock:
+            collection = self._get_collection()
+            entry_id = self._entry_id(question)
+            collection.upsert(
+                ids=[entry_id],
+                documents=[question],
+                metadatas=[{
+                    "question": question,
+                    "answer": answer,
+                    "signature": math_signature(question),
+                    "last_used": time.time()
+                }]
+            )
+            self._lru[entry_id] = None
+            self._lru.move_to_end(entry_id)
+
+            overflow = len(self._lru) - self.max_entries
+            if overflow > 0:
+                evicted = [self._lru.popitem(last=False)[0] for _ in range(overflow)]
+                collection.delete(ids=evicted)
+                self.evictions += len(evicted)
+
+    def invalidate_question(self, question: str) -> int:
+        """Drop cached solutions for this question and its close paraphrases"""
+        with self._lock:
+            if self._collection is None or not self._lru:
+                return 0
+
+            results = self._collection.query(
+                query_texts=[question],
+                n_results=min(10, len(self._lru)),
+                include=["distances"]
+            )
+            stale = [
+                entry_id for entry_id, distance in zip(results['ids'][0], results['distances'][0])
+                if distance <= self.distance_threshold
+            ]
+            if stale:
+                self._collection.delete(ids=stale)
+                for entry_id in stale:
+                    self._lru.pop(entry_id, None)
+            return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        distances = list(self._recent_distances)
+        distribution = {}
+        lower = 0.0
+        for upper in _DISTANCE_BUCKETS:
+            distribution[f"{lower:.2f}-{upper:.2f}"] = sum(1 for d in distances if lower <= d < upper)
+            lower = upper
+        distribution[f">={lower:.2f}"] = sum(1 for d in distances if d >= lower)
+
+        return {
+            'size': len(self._lru),
+            'max_entries': self.max_entries,
+            'distance_threshold': self.distance_threshold,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'signature_rejections': self.signature_rejections,
+            'nearest_distance': {
+                'samples': len(distances),
+                'median': statistics.median(distances) if distances else None,
+                'min': min(distances) if distances else None,
+                'distribution': distribution
+            }
+        }
+
+# Global semantic cache instance
+semantic_cache = SemanticCache(
+    max_entries=int(os.getenv("SEMANTIC_CACHE_SIZE", "5000")),
+    distance_threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.15"))
+)
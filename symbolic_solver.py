@@ -0,0 +1,400 @@
+import asyncio
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+try:
+    import sympy
+    from sympy import Derivative, Integral, Poly, diff, factor, integrate, simplify, solve
+    from sympy.parsing.sympy_parser import (
+        convert_xor, implicit_multiplication_application, parse_expr, standard_transformations
+    )
+    SYMPY_AVAILABLE = True
+    _TRANSFORMATIONS = standard_transformations + (implicit_multiplication_application, convert_xor)
+    _LOCALS = {
+        'e': sympy.E, 'pi': sympy.pi, 'ln': sympy.log, 'cosec': sympy.csc,
+        'arcsin': sympy.asin, 'arccos': sympy.acos, 'arctan': sympy.atan
+    }
+except ImportError:  # the fast path is skipped without SymPy
+    SYMPY_AVAILABLE = False
+
+SOURCE = "Symbolic Solver"
+MAX_EXPRESSION_LENGTH = 120
+# Bounds checked on the unevaluated tree, so 9^9^9^9 is refused before SymPy computes it
+MAX_EXPONENT = 100
+MAX_INTEGER_DIGITS = 15
+
+# Names an expression may contain; any other word means it is not (only) mathematics
+FUNCTION_NAMES = {
+    'sin', 'cos', 'tan', 'sec', 'csc', 'cosec', 'cot', 'asin', 'acos', 'atan', 'arcsin', 'arccos', 'arctan',
+    'sinh', 'cosh', 'tanh', 'log', 'ln', 'exp', 'sqrt', 'pi'
+}
+_REPLACEMENTS = {'²': '^2', '³': '^3', 'π': 'pi', '·': '*', '×': '*', '÷': '/', '−': '-', '–': '-'}
+_ALLOWED_CHARS = re.compile(r'^[0-9a-z+\-*/^().\s]+$')
+_WORD = re.compile(r'[a-z]+')
+
+_PREFIX = r'^(?:please\s+)?(?:(?:find|what is|what\'s|compute|calculate|determine|evaluate|give)\s+)?(?:the\s+)?'
+_DERIVATIVE_PATTERNS = [
+    re.compile(_PREFIX + r'(?:derivative|differentiate)\s+(?:of\s+)?'
+               r'(?:(?:[a-z]\s*\(\s*(?P<fvar>[a-z])\s*\)|y)\s*=\s*)?(?P<expr>.+?)'
+               r'(?:\s+with respect to\s+(?P<var>[a-z]))?$'),
+    re.compile(_PREFIX + r'd/d(?P<var>[a-z])\s*(?P<expr>.+)$'),
+]
+_SOLVE_PATTERN = re.compile(
+    r'^(?:please\s+)?solve\s+(?:for\s+(?P<var>[a-z])\s*[:,]?\s*)?(?:the\s+)?(?:equation\s*:?\s*)?'
+    r'(?P<lhs>[^=]+)=(?P<rhs>[^=]+?)(?:\s+for\s+(?P<var2>[a-z]))?$'
+)
+_INTEGRAL_PATTERNS = [
+    # ∫(0 to π) x sin(x) dx
+    re.compile(_PREFIX + r'(?:definite\s+)?(?:integral\s*:?\s*)?∫\s*\(\s*(?:from\s+)?(?P<a>[^()]+?)\s+to\s+(?P<b>[^()]+?)\s*\)'
+               r'\s*(?P<expr>.+?)\s*d(?P<var>[a-z])$'),
+    # ∫_0^1 x^2 dx
+    re.compile(_PREFIX + r'(?:definite\s+)?(?:integral\s*:?\s*)?∫\s*_\s*\{?(?P<a>[^\s^}]+)\}?\s*\^\s*\{?(?P<b>[^\s}]+)\}?'
+               r'\s*(?P<expr>.+?)\s*d(?P<var>[a-z])$'),
+    # integral of x^2 from 0 to 1
+    re.compile(_PREFIX + r'(?:definite\s+)?integral\s+of\s+(?P<expr>.+?)(?:\s*d(?P<var>[a-z]))?'
+               r'\s+from\s+(?:[a-z]\s*=\s*)?(?P<a>\S+)\s+to\s+(?P<b>\S+)$'),
+]
+
+def _normalize(text: str) -> str:
+    text = text.strip().lower()
+    for symbol, replacement in _REPLACEMENTS.items():
+        text = text.replace(symbol, replacement)
+    return text
+
+def parse_expression(text: str):
+    """SymPy expression for plain math text, or None for anything with non-math words in it"""
+    text = _normalize(text)
+    if not text or len(text) > MAX_EXPRESSION_LENGTH or not _ALLOWED_CHARS.match(text):
+        return None
+    if any(len(word) > 1 and word not in FUNCTION_NAMES for word in _WORD.findall(text)):
+        return None
+    try:
+        tree = parse_expr(text, local_dict=_LOCALS, transformations=_TRANSFORMATIONS, evaluate=False)
+        if not isinstance(tree, sympy.Expr) or not _within_bounds(tree):
+            return None
+        expr = parse_expr(text, local_dict=_LOCALS, transformations=_TRANSFORMATIONS)
+    except Exception:
+        return None
+    return expr if isinstance(expr, sympy.Expr) else None
+
+def _within_bounds(tree) -> bool:
+    """No power towers, no exponents above MAX_EXPONENT and no huge integer literals"""
+    for node in sympy.preorder_traversal(tree):
+        if node.is_Integer and len(str(abs(int(node)))) > MAX_INTEGER_DIGITS:
+            return False
+        if node.is_Pow:
+            exponent = node.exp
+            # Pow(_, -1) is how the unevaluated tree writes division, e.g. x^(1/2)
+            if any(sub.is_Pow and sub.exp != -1 for sub in sympy.preorder_traversal(exponent)):
+                return False
+            if exponent.is_number and abs(exponent) > MAX_EXPONENT:
+                return False
+    return True
+
+def format_expression(expr) -> str:
+    """Readable plain text: x² cos(x) + 2x sin(x) rather than x**2*cos(x) + 2*x*sin(x)"""
+    text = sympy.sstr(expr).replace('**', '^')
+    # 2*x -> 2x, but keep exponents (x^2*sin(x)) and functions (2*sin(x)) apart
+    text = re.sub(r'(?<![\^.\d])(\d+)\*(?=[a-z](?![a-z])|\()', r'\1', text)
+    text = text.replace('*', ' ')
+    text = re.sub(r'\^2(?![\d.])', '²', text)
+    text = re.sub(r'\^3(?![\d.])', '³', text)
+    text = re.sub(r'\bexp\(([a-z]|\d+)\)', r'e^\1', text)
+    text = re.sub(r'\bexp\(', 'e^(', text)
+    text = re.sub(r'\blog\(', 'ln(', text)
+    text = re.sub(r'\bpi\b', 'π', text)
+    text = re.sub(r'\bI\b', 'i', text)
+    return re.sub(r'\bE\b', 'e', text)
+
+def _single_symbol(expr, explicit: Optional[str]):
+    symbols = expr.free_symbols
+    if explicit:
+        return sympy.Symbol(explicit)
+    if len(symbols) == 1:
+        return next(iter(symbols))
+    return sympy.Symbol('x') if not symbols else None
+
+def _is_exact_number(value) -> bool:
+    return value.is_number and value.is_finite and not value.has(sympy.nan, sympy.zoo)
+
+class SymbolicAnswer:
+    def __init__(self, kind: str, answer: str, result: str):
+        self.kind = kind
+        self.answer = answer
+        self.result = result
+
+class SymbolicSolver:
+    """Answer routine derivative, equation and definite-integral questions with SymPy.
+
+    Only questions that parse completely are answered; everything else
+    (and any result SymPy leaves unevaluated) returns None and goes on to
+    the KB/MCP/LLM route.
+    """
+
+    def __init__(self, enabled: bool = True, timeout: float = 2.0, workers: int = 2):
+        self.enabled = enabled and SYMPY_AVAILABLE
+        self.timeout = timeout
+        self.workers = max(1, workers)
+        # Own threads, so a runaway SymPy computation cannot starve the shared to_thread pool
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="symbolic")
+        self._running = 0
+        self.attempted = 0
+        self.answered = 0
+        self.timeouts = 0
+        self.skipped_busy = 0
+        self.by_kind = {'derivative': 0, 'equation': 0, 'integral': 0}
+        self.seconds_total = 0.0
+
+    def solve(self, question: str) -> Optional[SymbolicAnswer]:
+        text = _normalize(question).rstrip('?.! ')
+        for handler in (self._derivative, self._integral, self._equation):
+            try:
+                answer = handler(text)
+            except Exception:
+                answer = None
+            if answer is not None:
+                return answer
+        return None
+
+    async def try_answer(self, question: str) -> Optional[SymbolicAnswer]:
+        """``solve`` on the solver's threads; gives up after ``timeout`` seconds.
+
+        When every solver thread is still busy (e.g. with computations that
+        timed out) the question goes straight to the usual route.
+        """
+        if not self.enabled:
+            return None
+        self.attempted += 1
+        if self._running >= self.workers:
+            self.skipped_busy += 1
+            return None
+        started = time.perf_counter()
+        self._running += 1
+        future = asyncio.get_running_loop().run_in_executor(self._executor, self.solve, question)
+        future.add_done_callback(self._finished)
+        try:
+            answer = await asyncio.wait_for(asyncio.shield(future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            # The SymPy thread cannot be interrupted; it keeps its worker until it finishes
+            self.timeouts += 1
+            answer = None
+        self.seconds_total += time.perf_counter() - started
+        if answer is not None:
+            self.answered += 1
+            self.by_kind[answer.kind] += 1
+        return answer
+
+    def _finished(self, _future):
+        self._running -= 1
+
+    def _derivative(self, text: str) -> Optional[SymbolicAnswer]:
+        for pattern in _DERIVATIVE_PATTERNS:
+            match = pattern.match(text)
+            if match:
+                break
+        else:
+            return None
+        expr = parse_expression(match.group('expr'))
+        if expr is None:
+            return None
+        explicit = match.group('var') or (match.groupdict().get('fvar'))
+        var = _single_symbol(expr, explicit)
+        if var is None or (expr.free_symbols - {var}):
+            return None
+        result = diff(expr, var)
+        if result.has(Derivative):
+            return None
+        # Rational functions read better over a common denominator; others as the rules produce them
+        if result.is_rational_function(var) and not result.is_polynomial(var):
+            result = factor(result)
+
+        v = var.name
+        terms = sympy.Add.make_args(expr)
+        steps = [f"Write the function: f({v}) = {format_expression(expr)}"]
+        rules = _derivative_rules(expr, var)
+        if rules:
+            steps.append(f"Rules needed: {', '.join(rules)}.")
+        if len(terms) > 1:
+            steps.append("Differentiate term by term (sum rule).")
+        for term in terms:
+            steps.append(_derivative_step(term, var))
+        steps.append(f"Combine the results: f'({v}) = {format_expression(result)}")
+        return SymbolicAnswer(
+            'derivative',
+            _render(f"The derivative of {format_expression(expr)} with respect to {v} is {format_expression(result)}.",
+                    steps, f"f'({v}) = {format_expression(result)}"),
+            format_expression(result)
+        )
+
+    def _integral(self, text: str) -> Optional[SymbolicAnswer]:
+        for pattern in _INTEGRAL_PATTERNS:
+            match = pattern.match(text)
+            if match:
+                break
+        else:
+            return None
+        expr = parse_expression(match.group('expr'))
+        lower, upper = parse_expression(match.group('a')), parse_expression(match.group('b'))
+        if expr is None or lower is None or upper is None:
+            return None
+        if not (_is_exact_number(lower) and _is_exact_number(upper)):
+            return None
+        var = _single_symbol(expr, match.group('var'))
+        if var is None or (expr.free_symbols - {var}):
+            return None
+
+        antiderivative = integrate(expr, var)
+        value = integrate(expr, (var, lower, upper))
+        if antiderivative.has(Integral) or value.has(Integral) or not _is_exact_number(value):
+            return None
+        value = simplify(value)
+        # F(b) - F(a) must agree with the definite integral, or the integrand is singular in between
+        by_parts = simplify(antiderivative.subs(var, upper) - antiderivative.subs(var, lower))
+        if not _is_exact_number(by_parts) or simplify(by_parts - value) != 0:
+            return None
+
+        v = var.name
+        bounds = f"{format_expression(lower)} to {format_expression(upper)}"
+        steps = [f"Set up the integral: ∫({bounds}) {format_expression(expr)} d{v}"]
+        method = _integration_method(expr, var)
+        if method:
+            steps.append(f"Method: {method}.")
+        steps += [
+            f"Find an antiderivative: F({v}) = {format_expression(antiderivative)}",
+            f"Evaluate at the limits: F({format_expression(upper)}) - F({format_expression(lower)}) = "
+            f"{format_expression(antiderivative.subs(var, upper))} - ({format_expression(antiderivative.subs(var, lower))})",
+            f"Simplify: {format_expression(value)}"
+        ]
+        result = format_expression(value)
+        if not value.is_Rational:
+            result += f" ≈ {float(value):.6g}"
+        return SymbolicAnswer(
+            'integral',
+            _render(f"∫({bounds}) {format_expression(expr)} d{v} = {result}.", steps,
+                    f"∫({bounds}) {format_expression(expr)} d{v} = {result}"),
+            result
+        )
+
+    def _equation(self, text: str) -> Optional[SymbolicAnswer]:
+        match = _SOLVE_PATTERN.match(text)
+        if not match:
+            return None
+        lhs, rhs = parse_expression(match.group('lhs')), parse_expression(match.group('rhs'))
+        if lhs is None or rhs is None:
+            return None
+        equation = sympy.expand(lhs - rhs)
+        var = _single_symbol(equation, match.group('var') or match.group('var2'))
+        if var is None or var not in equation.free_symbols or (equation.free_symbols - {var}):
+            return None
+        try:
+            poly = Poly(equation, var)
+        except sympy.PolynomialError:
+            return None
+        if poly.degree() not in (1, 2) or not all(c.is_number for c in poly.all_coeffs()):
+            return None
+
+        v = var.name
+        roots = solve(equation, var)
+        steps = [f"Start from the equation: {format_expression(lhs)} = {format_expression(rhs)}"]
+        if rhs != 0:
+            steps.append(f"Move every term to one side: {format_expression(poly.as_expr())} = 0")
+        if poly.degree() == 1:
+            a, b = poly.all_coeffs()
+            if a == 1:
+                steps.append(f"Isolate {v}: {v} = {format_expression(roots[0])}")
+            else:
+                steps += [f"Isolate {v}: {format_expression(a * var)} = {format_expression(-b)}",
+                          f"Divide both sides by {format_expression(a)}: {v} = {format_expression(roots[0])}"]
+        else:
+            a, b, c = poly.all_coeffs()
+            discriminant = simplify(b ** 2 - 4 * a * c)
+            steps += [f"Identify the coefficients: a = {format_expression(a)}, b = {format_expression(b)}, c = {format_expression(c)}",
+                      f"Compute the discriminant: D = b² - 4ac = {format_expression(discriminant)}",
+                      f"Apply the quadratic formula: {v} = (-b ± √D) / (2a)"]
+            if discriminant.is_negative:
+                steps.append("D < 0, so there are no real solutions; the roots are complex.")
+        solutions = ", ".join(f"{v} = {format_expression(root)}" for root in roots)
+        steps.append(f"Check: substituting {solutions} into the original equation makes both sides equal.")
+        return SymbolicAnswer('equation', _render(f"The solution is {solutions}.", steps, solutions), solutions)
+
+    def stats(self) -> dict:
+        return {
+            'enabled': self.enabled,
+            'attempted': self.attempted,
+            'answered': self.answered,
+            'handled_share': self.answered / self.attempted if self.attempted else 0.0,
+            'timeouts': self.timeouts,
+            'skipped_busy': self.skipped_busy,
+            'busy_workers': self._running,
+            'derivatives': self.by_kind['derivative'],
+            'equations': self.by_kind['equation'],
+            'integrals': self.by_kind['integral'],
+            'mean_ms': self.seconds_total / self.attempted * 1000 if self.attempted else 0.0
+        }
+
+def _render(summary: str, steps: List[str], final: str) -> str:
+    lines = [summary, ""]
+    lines += [f"Step {i}: {step}" for i, step in enumerate(steps, 1)]
+    lines += ["", f"Final answer: {final}"]
+    return "\n".join(lines)
+
+def _depends(expr, var) -> bool:
+    return var in expr.free_symbols
+
+def _derivative_rules(expr, var) -> List[str]:
+    rules = []
+
+    def add(rule: str):
+        if rule not in rules:
+            rules.append(rule)
+
+    for node in sympy.preorder_traversal(expr):
+        if node.is_Mul and sum(_depends(factor, var) for factor in node.args) > 1:
+            quotient = any(factor.is_Pow and factor.exp.is_negative and _depends(factor.base, var)
+                           for factor in node.args)
+            add("quotient rule" if quotient else "product rule")
+        elif node.is_Pow and _depends(node.base, var) and not _depends(node.exp, var):
+            add("power rule")
+            if node.base != var:
+                add("chain rule")
+        elif node.is_Pow and _depends(node.exp, var):
+            add("exponential rule")
+        elif isinstance(node, sympy.Function) and _depends(node, var):
+            add("standard derivatives")
+            if any(arg != var and _depends(arg, var) for arg in node.args):
+                add("chain rule")
+    return rules
+
+def _derivative_step(term, var) -> str:
+    v = var.name
+    derivative = diff(term, var)
+    factors = [factor for factor in sympy.Mul.make_args(term) if _depends(factor, var)]
+    if len(factors) == 2 and not any(f.is_Pow and f.exp.is_negative for f in factors):
+        u, w = factors
+        coefficient = simplify(term / (u * w))
+        prefix = "" if coefficient == 1 else f"{format_expression(coefficient)} · "
+        return (f"Product rule on {format_expression(term)}: with u = {format_expression(u)}, "
+                f"w = {format_expression(w)}, u' = {format_expression(diff(u, var))}, "
+                f"w' = {format_expression(diff(w, var))}, so d/d{v}[{format_expression(term)}] = "
+                f"{prefix}(u'w + uw') = {format_expression(derivative)}")
+    return f"d/d{v}[{format_expression(term)}] = {format_expression(derivative)}"
+
+def _integration_method(expr, var) -> Optional[str]:
+    factors = [factor for factor in sympy.Mul.make_args(expr) if _depends(factor, var)]
+    if len(factors) == 2:
+        polynomial = [f for f in factors if f.is_polynomial(var)]
+        if len(polynomial) == 1:
+            return f"integration by parts with u = {format_expression(polynomial[0])}"
+    if expr.is_polynomial(var):
+        return "power rule for each term"
+    return None
+
+# Global solver; SYMBOLIC_SOLVER=false sends every question down the usual route
+symbolic_solver = SymbolicSolver(
+    enabled=os.getenv("SYMBOLIC_SOLVER", "true").lower() == "true",
+    timeout=float(os.getenv("SYMBOLIC_SOLVER_TIMEOUT", "2.0")),
+    workers=int(os.getenv("SYMBOLIC_SOLVER_WORKERS", "2"))
+)
@@ -0,0 +1,72 @@
+import asyncio
+import threading
+
+import pytest
+
+from evaluator import EvaluationRouter
+
+WEB_ANSWER = """The Pythagorean theorem relates the sides of a right triangle.
+
+Step 1: Label the legs a and b and the hypotenuse c.
+Step 2: Square each leg and add the squares together.
+Step 3: The sum equals the square of the hypotenuse, so a² + b² = c².
+Step 4: Therefore, given any two sides, the formula lets us solve for the third side of the triangle."""
+
+def no_llm():
+    raise AssertionError("local mode must not call the LLM evaluator")
+
+def test_inconclusive_local_evaluation_approves():
+    router = EvaluationRouter(mode="local")
+    evaluation = asyncio.run(router.evaluate(
+        "What is the Pythagorean theorem?", WEB_ANSWER, "MCP Web Search", "", llm_evaluate=no_llm
+    ))
+    assert evaluation.startswith("APPROVED")
+    stats = router.stats()
+    assert (stats['local_approved'], stats['llm_calls_saved']) == (1, 1)
+
+def test_local_feedback_is_not_counted_as_saved():
+    pytest.importorskip("sympy")  # the wrong answer is only caught by the symbolic check
+    router = EvaluationRouter(mode="local")
+    evaluation = asyncio.run(router.evaluate(
+        "Solve 2x + 5 = 15", WEB_ANSWER + "\nSo x = 4", "MCP Web Search", "", llm_evaluate=no_llm
+    ))
+    assert evaluation.startswith("HUMAN_FEEDBACK_NEEDED")
+    stats = router.stats()
+    assert (stats['local_feedback'], stats['llm_calls_saved']) == (1, 0)
+
+def test_local_scoring_runs_off_the_event_loop():
+    router = EvaluationRouter(mode="local")
+    threads = []
+    score = router.local_evaluator.score
+    router.local_evaluator.score = lambda *args: threads.append(threading.current_thread()) or score(*args)
+    asyncio.run(router.evaluate("What is 2 + 2?", WEB_ANSWER, "MCP Web Search", "", llm_evaluate=no_llm))
+    assert threads and threads[0] is not threading.main_thread()
+
+def test_hybrid_decides_approvals_locally():
+    router = EvaluationRouter(mode="hybrid", llm_sample_rate=0.0)
+    evaluation = asyncio.run(router.evaluate(
+        "What is the Pythagorean theorem?", WEB_ANSWER, "MCP Web Search", "", llm_evaluate=no_llm
+    ))
+    assert evaluation.startswith("APPROVED: local evaluator")
+    assert router.stats()['llm_calls_saved'] == 1
+
+def test_hybrid_sends_low_local_scores_to_the_llm():
+    router = EvaluationRouter(mode="hybrid", llm_sample_rate=0.0)
+
+    async def llm_evaluate():
+        return "APPROVED: professor"
+
+    evaluation = asyncio.run(router.evaluate(
+        "What is the Pythagorean theorem?", "a² + b² = c²", "MCP Web Search", "", llm_evaluate=llm_evaluate
+    ))
+    assert evaluation == "APPROVED: professor"
+    stats = router.stats()
+    assert (stats['llm_decisions'], stats['llm_reason_low_score'], stats['local_feedback']) == (1, 1, 0)
+
+def test_hybrid_does_not_grade_failed_generations_with_the_llm():
+    router = EvaluationRouter(mode="hybrid", llm_sample_rate=0.0)
+    evaluation = asyncio.run(router.evaluate(
+        "What is the Pythagorean theorem?", "Error: generation failed", "MCP Web Search", "",
+        llm_evaluate=no_llm, generation_failed=True
+    ))
+    assert evaluation.startswith("HUMAN_FEEDBACK_NEEDED")
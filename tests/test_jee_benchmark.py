@@ -0,0 +1,33 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("crewai")
+
+import jee_benchmark
+
+def test_warmup_respects_concurrency(monkeypatch):
+    in_flight = 0
+    peak = 0
+    calls = 0
+
+    async def fake_query(question, use_cache=False):
+        nonlocal in_flight, peak, calls
+        in_flight += 1
+        calls += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return {'answer': question, 'verdict': 'APPROVED', 'source': 'Knowledge Base',
+                'trace': {'stages': {'solve': 0.01}}}
+
+    monkeypatch.setattr(jee_benchmark, "math_agent_query_detailed", fake_query)
+    questions = [{'question': f"Question {i}", 'expected_keywords': []} for i in range(6)]
+    benchmark = jee_benchmark.JEEBenchmark()
+    asyncio.run(benchmark.run_benchmark(questions, concurrency=2, warmup_runs=2))
+
+    assert calls == 18
+    assert peak == 2
+    # Warm-up answers are not recorded
+    assert len(benchmark.results) == 6
+    assert benchmark.metrics['total_questions'] == 6
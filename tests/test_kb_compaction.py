@@ -0,0 +1,93 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("chromadb")
+
+from kb_compaction import plan_compaction
+
+def test_near_duplicates_with_different_functions_are_not_merged():
+    ids = ["sin", "cos"]
+    embeddings = np.array([[1.0, 0.0], [0.999, 0.01]])
+    metadatas = [{"question": "Find the derivative of sin x", "accuracy_score": 9},
+                 {"question": "Find the derivative of cos x", "accuracy_score": 8}]
+
+    assert plan_compaction(ids, embeddings, metadatas, threshold=0.1) == {"sin": [], "cos": []}
+
+def test_corrections_with_swapped_operands_are_not_merged():
+    ids = ["first", "second"]
+    embeddings = np.array([[1.0, 0.0], [0.999, 0.01]])
+    metadatas = [{"question": "solve 2x+5=15", "accuracy_score": 9},
+                 {"question": "solve 5x+2=15", "accuracy_score": 8}]
+
+    assert plan_compaction(ids, embeddings, metadatas, threshold=0.1) == {"first": [], "second": []}
+
+def test_rephrased_duplicates_merge_into_best_scored_entry():
+    ids = ["low", "high", "other"]
+    embeddings = np.array([[1.0, 0.0], [0.99, 0.05], [0.0, 1.0]])
+    metadatas = [{"question": "What is the derivative of x^2?", "accuracy_score": 6, "clarity_score": 6},
+                 {"question": "Differentiate x^2", "accuracy_score": 9, "clarity_score": 9},
+                 {"question": "Differentiate x^2 twice", "accuracy_score": 9, "clarity_score": 9}]
+
+    assert plan_compaction(ids, embeddings, metadatas, threshold=0.1) == {"high": ["low"], "other": []}
+
+def test_seeds_are_kept_and_absorb_matching_corrections():
+    ids = ["seed_a", "seed_b", "correction"]
+    embeddings = np.array([[1.0, 0.0], [1.0, 0.0], [0.99, 0.05]])
+    metadatas = [{"question": "Solve x + 2 = 5", "source": "enhanced_knowledge_base"},
+                 {"question": "Solve x + 2 = 5", "source": "enhanced_knowledge_base"},
+                 {"question": "solve x+2=5", "source": "human_corrected", "accuracy_score": 10}]
+
+    clusters = plan_compaction(ids, embeddings, metadatas, threshold=0.1)
+    assert set(clusters) == {"seed_a", "seed_b"}
+    assert sorted(sum(clusters.values(), [])) == ["correction"]
+
+def make_kb(name):
+    import uuid
+    from types import SimpleNamespace
+
+    import chromadb
+
+    client = chromadb.Client(chromadb.config.Settings(anonymized_telemetry=False))
+    name = f"{name}_{uuid.uuid4().hex[:8]}"
+    collection = client.create_collection(name)
+    collection.add(ids=["keep", "drop"], embeddings=[[1.0, 0.0], [0.99, 0.05]],
+                   documents=["kept", "dropped"], metadatas=[{"question": "x"}, {"question": "x"}])
+    kb = SimpleNamespace(client=client, collection=collection, embedding_function=None,
+                         corrections=SimpleNamespace(collection=collection))
+    return kb, name
+
+def collection_names(client):
+    return {collection.name for collection in client.list_collections()}
+
+def test_rebuild_swaps_in_the_compacted_collection():
+    from kb_compaction import rebuild_collection
+
+    kb, name = make_kb("swap")
+    entries = kb.collection.get(include=["embeddings", "documents", "metadatas"])
+    rebuild_collection(kb, entries, ["keep"])
+
+    assert kb.collection.name == name
+    assert kb.client.get_collection(name).get()['ids'] == ["keep"]
+    assert kb.corrections.collection is kb.collection
+    assert not {name + "_backup", name + "_compacting"} & collection_names(kb.client)
+
+def test_failed_swap_keeps_the_original_collection(monkeypatch):
+    from chromadb.api.models.Collection import Collection
+
+    from kb_compaction import rebuild_collection
+
+    kb, name = make_kb("failed_swap")
+    entries = kb.collection.get(include=["embeddings", "documents", "metadatas"])
+    modify = Collection.modify
+
+    def flaky_modify(self, name=None, metadata=None):
+        if self.name.endswith("_compacting"):
+            raise RuntimeError("disk full")
+        return modify(self, name=name, metadata=metadata)
+
+    monkeypatch.setattr(Collection, "modify", flaky_modify)
+    with pytest.raises(RuntimeError):
+        rebuild_collection(kb, entries, ["keep"])
+
+    assert sorted(kb.client.get_collection(name).get()['ids']) == ["drop", "keep"]
+    assert name + "_backup" not in collection_names(kb.client)
@@ -0,0 +1,77 @@
+import uuid
+
+import pytest
+
+chromadb = pytest.importorskip("chromadb")
+
+from knowledge_base import (
+    CATEGORIES_BACKFILLED_KEY, backfill_categories, migrate_categories, recover_interrupted_compaction
+)
+from query_classifier import query_classifier
+
+def make_collection():
+    client = chromadb.Client(chromadb.config.Settings(anonymized_telemetry=False))
+    return client.create_collection(f"backfill_{uuid.uuid4().hex}")
+
+def test_documents_without_category_are_backfilled():
+    collection = make_collection()
+    collection.add(
+        ids=["seed", "old_correction", "no_metadata_question"],
+        embeddings=[[1.0, 0.0], [0.9, 0.1], [0.0, 1.0]],
+        documents=["Question: What is a prime?", "Question: Find the derivative of x^3. Answer: 3x^2",
+                   "Question: What is the probability of rolling a six with a fair dice?"],
+        metadatas=[{"category": "algebra", "source": "enhanced_knowledge_base"},
+                   {"question": "Find the derivative of x^3", "source": "human_corrected", "corrected": True},
+                   {"source": "human_corrected"}]
+    )
+
+    assert backfill_categories(collection, batch_size=2) == 2
+    metadatas = dict(zip(*(lambda page: (page['ids'], page['metadatas']))(collection.get())))
+    assert metadatas["seed"]["category"] == "algebra"
+    assert metadatas["old_correction"] == {"question": "Find the derivative of x^3", "source": "human_corrected",
+                                           "corrected": True, "category": "calculus"}
+    assert metadatas["no_metadata_question"]["category"] == "probability"
+
+    # The correction is visible again to a category-filtered search
+    where = query_classifier.where_filter("What is the derivative of x^3?")
+    results = collection.get(where=where)
+    assert "old_correction" in results['ids']
+    assert backfill_categories(collection) == 0
+
+def test_recovery_restores_the_backup_when_the_swap_was_interrupted():
+    client = chromadb.Client(chromadb.config.Settings(anonymized_telemetry=False))
+    name = f"recover_{uuid.uuid4().hex[:8]}"
+    client.create_collection(name + "_backup").add(ids=["correction"], embeddings=[[1.0, 0.0]])
+    client.create_collection(name + "_compacting")
+
+    assert recover_interrupted_compaction(client, name) == "restored the pre-compaction collection"
+    names = {collection.name for collection in client.list_collections()}
+    assert name in names and not {name + "_backup", name + "_compacting"} & names
+    assert client.get_collection(name).get()['ids'] == ["correction"]
+    assert recover_interrupted_compaction(client, name) is None
+
+def test_recovery_drops_the_backup_once_the_swap_finished():
+    client = chromadb.Client(chromadb.config.Settings(anonymized_telemetry=False))
+    name = f"recover_{uuid.uuid4().hex[:8]}"
+    client.create_collection(name).add(ids=["compacted"], embeddings=[[1.0, 0.0]])
+    client.create_collection(name + "_backup").add(ids=["original"], embeddings=[[1.0, 0.0]])
+
+    assert recover_interrupted_compaction(client, name) == "dropped the pre-compaction backup"
+    assert client.get_collection(name).get()['ids'] == ["compacted"]
+    assert name + "_backup" not in {collection.name for collection in client.list_collections()}
+
+def test_category_migration_runs_once_per_collection():
+    collection = make_collection()
+    collection.add(ids=["old_correction"], embeddings=[[1.0, 0.0]],
+                   documents=["Question: Find the derivative of x^3"], metadatas=[{"source": "human_corrected"}])
+
+    assert migrate_categories(collection) == 1
+    assert collection.metadata[CATEGORIES_BACKFILLED_KEY] is True
+
+    # Later starts trust the marker and do not scan the documents again
+    collection.add(ids=["unscanned"], embeddings=[[0.0, 1.0]],
+                   documents=["Question: What is a prime?"], metadatas=[{"source": "human_corrected"}])
+    client = chromadb.Client(chromadb.config.Settings(anonymized_telemetry=False))
+    reopened = client.get_collection(collection.name)
+    assert migrate_categories(reopened) == 0
+    assert "category" not in reopened.get(ids=["unscanned"])['metadatas'][0]
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from llm_scheduler import LLMScheduler, llm_priority
+
+class RateLimited(Exception):
+    code = 429
+
+def test_cancelled_calls_release_their_slots():
+    async def scenario():
+        scheduler = LLMScheduler(rate_per_minute=0, max_concurrency=2)
+        in_flight = [asyncio.create_task(scheduler.run(lambda: asyncio.sleep(10))) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for task in in_flight:
+            task.cancel()
+        await asyncio.gather(*in_flight, return_exceptions=True)
+        assert scheduler.stats()['active'] == 0
+        return await asyncio.wait_for(scheduler.run(lambda: asyncio.sleep(0, result="ok")), timeout=1)
+
+    assert asyncio.run(scenario()) == "ok"
+
+def test_cancelled_waiter_does_not_hold_a_slot():
+    async def scenario():
+        scheduler = LLMScheduler(rate_per_minute=0, max_concurrency=1)
+        holder = asyncio.create_task(scheduler.run(lambda: asyncio.sleep(0.05)))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(scheduler.run(lambda: asyncio.sleep(0)))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.gather(holder, waiter, return_exceptions=True)
+        stats = scheduler.stats()
+        assert (stats['active'], stats['queue_depth']) == (0, 0)
+
+    asyncio.run(scenario())
+
+def test_waiters_are_served_by_priority():
+    async def scenario():
+        scheduler = LLMScheduler(rate_per_minute=0, max_concurrency=1)
+        order = []
+
+        async def job(priority, tag):
+            with llm_priority(priority):
+                await scheduler.run(lambda: asyncio.sleep(0.01, result=order.append(tag)))
+
+        blocker = asyncio.create_task(scheduler.run(lambda: asyncio.sleep(0.02)))
+        await asyncio.sleep(0)
+        tasks = [asyncio.create_task(job(priority, priority))
+                 for priority in ("feedback", "benchmark", "batch", "interactive")]
+        await asyncio.gather(blocker, *tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["interactive", "batch", "benchmark", "feedback"]
+
+def test_rate_limit_errors_are_retried():
+    async def scenario():
+        scheduler = LLMScheduler(rate_per_minute=0, max_retries=3, base_delay=0.001)
+        attempts = []
+
+        async def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise RateLimited()
+            return "ok"
+
+        result = await scheduler.run(flaky)
+        return result, len(attempts), scheduler.stats()
+
+    result, attempts, stats = asyncio.run(scenario())
+    assert (result, attempts, stats['rate_limited'], stats['active']) == ("ok", 3, 2, 0)
+
+def test_other_errors_are_not_retried():
+    async def scenario():
+        scheduler = LLMScheduler(rate_per_minute=0)
+
+        async def broken():
+            raise ValueError("bad prompt")
+
+        with pytest.raises(ValueError):
+            await scheduler.run(broken)
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert (stats['retries'], stats['failed'], stats['active']) == (0, 1, 0)
@@ -0,0 +1,6 @@
+from metrics import nearest_rank
+
+def test_nearest_rank():
+    assert nearest_rank([], 95) == 0.0
+    assert nearest_rank([3.0, 1.0, 2.0], 50) == 2.0
+    assert nearest_rank([3.0, 1.0, 2.0], 100) == 3.0
@@ -0,0 +1,51 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from replay_store import ReplayMissError, ReplayStore
+
+def test_recordings_are_appended_and_replayed(tmp_path):
+    path = tmp_path / "replay.jsonl"
+    store = ReplayStore(str(path))
+    asyncio.run(store.put("llm", {"prompt": "2 + 2"}, "4"))
+    asyncio.run(store.put("mcp", {"query": "pi"}, [["3.14"], True]))
+    asyncio.run(store.put("llm", {"prompt": "2 + 2"}, "four"))
+
+    lines = path.read_text().splitlines()
+    assert len(lines) == 3  # one line per recording, nothing rewritten
+    reloaded = ReplayStore(str(path))
+    assert reloaded.get("llm", {"prompt": "2 + 2"}) == "four"
+    assert reloaded.get("mcp", {"query": "pi"}) == [["3.14"], True]
+    with pytest.raises(ReplayMissError):
+        reloaded.get("llm", {"prompt": "3 + 3"})
+
+def test_file_writes_run_off_the_event_loop(tmp_path, monkeypatch):
+    store = ReplayStore(str(tmp_path / "replay.jsonl"))
+    threads = []
+    append = store._append
+    monkeypatch.setattr(store, "_append", lambda line: threads.append(threading.current_thread()) or append(line))
+    asyncio.run(store.put("llm", {"prompt": "x"}, "y"))
+    assert threads and threads[0] is not threading.main_thread()
+
+def test_truncated_last_line_is_skipped(tmp_path):
+    path = tmp_path / "replay.jsonl"
+    store = ReplayStore(str(path))
+    asyncio.run(store.put("llm", {"prompt": "x"}, "y"))
+    with open(path, "a") as f:
+        f.write('{"key": "llm:abc", "requ')
+    assert ReplayStore(str(path)).get("llm", {"prompt": "x"}) == "y"
+
+def test_old_single_object_files_load_and_convert(tmp_path):
+    path = tmp_path / "replay.json"
+    key = ReplayStore.key("llm", {"prompt": "x"})
+    path.write_text(json.dumps({key: {"request": {"prompt": "x"}, "response": "y"}}, indent=1))
+
+    store = ReplayStore(str(path))
+    assert store.get("llm", {"prompt": "x"}) == "y"
+    asyncio.run(store.put("llm", {"prompt": "z"}, "w"))
+
+    reloaded = ReplayStore(str(path))
+    assert (reloaded.get("llm", {"prompt": "x"}), reloaded.get("llm", {"prompt": "z"})) == ("y", "w")
+    assert len(path.read_text().splitlines()) == 2
@@ -0,0 +1,24 @@
+from response_cache import normalize_question
+from semantic_cache import math_signature
+
+def test_sentence_punctuation_is_stripped():
+    assert normalize_question("What is 2 + 2?") == normalize_question("what is 2 + 2")
+    assert normalize_question("Great question!") == "great question"
+    assert normalize_question("What's 'x'?") == "what s x"
+    assert normalize_question("Round 3.14.") == "round 3.14"
+
+def test_factorials_are_kept():
+    assert normalize_question("Calculate 5!") == "calculate 5!"
+    assert normalize_question("Calculate 5!") != normalize_question("Calculate 5")
+    assert normalize_question("Simplify (n+1)!/n!?") == "simplify (n+1)!/n!"
+    assert normalize_question("Solve x ≠ 3") == "solve x != 3"
+
+def test_primes_are_kept():
+    assert normalize_question("Find f'(x) for f(x) = x^3") == "find f'(x) for f(x) = x^3"
+    assert normalize_question("Find f''(x)") != normalize_question("Find f'(x)")
+    assert normalize_question("If y' = 2x, find y") == "if y' = 2x find y"
+    assert normalize_question("the students' (average) mark") == "the students (average) mark"
+
+def test_signature_distinguishes_factorials_and_derivative_order():
+    assert math_signature("Calculate 5!") != math_signature("Calculate 5")
+    assert math_signature("Find f'(x) of sin x") != math_signature("Find f''(x) of sin x")
@@ -0,0 +1,28 @@
+import pytest
+
+from semantic_cache import math_signature
+
+@pytest.mark.parametrize("first, second", [
+    ("Solve 2x + 5 = 15", "Solve 5x + 2 = 15"),
+    ("Evaluate 2^10", "Evaluate 10^2"),
+    ("Factor x^2 - 3x", "Factor x^3 - 2x"),
+    ("Simplify x + 2", "Simplify x - 2"),
+    ("Probability of 2 heads in 5 tosses", "Probability of 5 heads in 2 tosses"),
+    ("Derivative of sin x", "Derivative of cos x"),
+    ("Solve dy/dx = y/x", "Solve dy/dx = x/y"),
+])
+def test_swapped_operands_have_different_signatures(first, second):
+    assert math_signature(first) != math_signature(second)
+
+@pytest.mark.parametrize("first, second", [
+    ("Solve 2x + 5 = 15", "How do I solve 2x+5=15?"),
+    ("What is the derivative of sin x?", "Find the derivative of sin x"),
+    ("Find a number whose square is 49", "Find the number whose square is 49"),
+    ("Explain the step-by-step integral of e^x", "Explain the integral of e^x"),
+])
+def test_rephrasings_share_a_signature(first, second):
+    assert math_signature(first) == math_signature(second)
+
+def test_signature_keeps_math_tokens_in_order():
+    assert math_signature("Solve 2x + 5 = 15") == "2 x + 5 = 15"
+    assert math_signature("Find f''(x) if f(x) = sin x") == "f'' ( x ) f ( x ) = sin x"
@@ -0,0 +1,42 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("sympy")
+
+from symbolic_solver import SymbolicSolver, parse_expression
+
+@pytest.mark.parametrize("question, final", [
+    ("Find the derivative of f(x) = x²sin(x)", "f'(x) = x² cos(x) + 2x sin(x)"),
+    ("Solve 2x + 5 = 15", "x = 5"),
+    ("Solve for x: x^2 - 5x + 6 = 0", "x = 2, x = 3"),
+    ("Evaluate the integral ∫(0 to π) x sin(x) dx", "= π"),
+])
+def test_routine_questions_are_answered(question, final):
+    answer = SymbolicSolver().solve(question)
+    assert answer is not None
+    assert final in answer.answer.splitlines()[-1]
+
+@pytest.mark.parametrize("question", [
+    "Solve the differential equation: dy/dx = y/x",
+    "What is the Pythagorean theorem?",
+    "∫(-1 to 1) 1/x^2 dx",
+])
+def test_unrecognized_or_untrusted_questions_fall_through(question):
+    assert SymbolicSolver().solve(question) is None
+
+@pytest.mark.parametrize("text", ["9^9^9^9", "9^(9^9)", "2^1000000", "99999999999999999999 x"])
+def test_huge_powers_are_refused_before_evaluation(text):
+    started = time.perf_counter()
+    assert parse_expression(text) is None
+    assert time.perf_counter() - started < 1
+
+def test_fractional_exponents_are_allowed():
+    assert parse_expression("x^(1/2)") is not None
+
+def test_busy_workers_skip_the_solver():
+    solver = SymbolicSolver(workers=1)
+    solver._running = 1
+    assert asyncio.run(solver.try_answer("Solve 2x + 5 = 15")) is None
+    assert solver.stats()['skipped_busy'] == 1
@@ -0,0 +1,66 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+_current_trace: ContextVar[Optional["PipelineTrace"]] = ContextVar("pipeline_trace", default=None)
+
+class PipelineTrace:
+    """Per-request record of pipeline stages (spans) and routing decisions"""
+
+    def __init__(self, question: str):
+        self.question = question
+        self.started = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.attributes: Dict[str, Any] = {}
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Dict[str, Any]]:
+        record = {'name': name, 'start': time.perf_counter() - self.started, **attributes}
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - started
+            self.spans.append(record)
+
+    def stage_seconds(self) -> Dict[str, float]:
+        """Total time per stage name"""
+        totals: Dict[str, float] = {}
+        for record in self.spans:
+            totals[record['name']] = totals.get(record['name'], 0.0) + record['seconds']
+        return totals
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'total_seconds': time.perf_counter() - self.started,
+            'stages': self.stage_seconds(),
+            'spans': list(self.spans),
+            **self.attributes
+        }
+
+@contextmanager
+def start_trace(question: str) -> Iterator[PipelineTrace]:
+    """Make a new trace current for the code (and tasks) run inside the block"""
+    trace = PipelineTrace(question)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+@contextmanager
+def stage(name: str, **attributes) -> Iterator[Optional[Dict[str, Any]]]:
+    """Time a pipeline stage on the current trace; a no-op outside a trace"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    with trace.span(name, **attributes) as record:
+        yield record
+
+def annotate(key: str, value: Any):
+    """Attach a routing decision or score to the current trace"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attributes[key] = value